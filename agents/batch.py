@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+from handlers.tracing_handler import TracingHandler
+from sql_agent import build_agent, build_agent_executor
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", 4))
+
+
+def read_questions(path):
+    # One question per line, empty lines and lines starting with # are skipped
+    with open(path) as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class BatchRunner:
+    # Answers many independent questions with `workers` agent executors at the
+    # same time. Each worker thread has its own executor and memory (cleared
+    # before every question so answers don't leak into each other), the model
+    # client, the tools and their connection pool and caches are shared.
+    def __init__(self, workers=BATCH_WORKERS, callbacks=None, chat=None):
+        self.workers = workers
+        self.callbacks = callbacks
+        self._agent = build_agent(chat)
+        self._local = threading.local()
+
+    def _executor(self):
+        if not hasattr(self._local, "executor"):
+            self._local.executor = build_agent_executor(self._agent)
+        return self._local.executor
+
+    def ask(self, index, question):
+        executor = self._executor()
+        executor.memory.clear()
+        started = time.perf_counter()
+        result = {"index": index, "question": question, "output": None}
+        try:
+            result["output"] = executor.run(question, callbacks=self.callbacks)
+        except Exception as e:
+            result["error"] = repr(e)
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        result["worker"] = threading.current_thread().name
+        return result
+
+    def run(self, questions, output):
+        # Results are written as soon as each question finishes, so the order of
+        # the lines is the order they finished in (use "index" to sort them)
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="batch"
+        ) as pool:
+            futures = [
+                pool.submit(self.ask, index, question)
+                for index, question in enumerate(questions)
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+                latencies.append(result["seconds"])
+                errors += "error" in result
+                print(
+                    f"[{len(latencies)}/{len(questions)}] {result['seconds']}s "
+                    f"{result['question']}"
+                )
+        return self.summary(latencies, errors, time.perf_counter() - started)
+
+    @staticmethod
+    def summary(latencies, errors, elapsed):
+        if not latencies:
+            return {"questions": 0}
+        return {
+            "questions": len(latencies),
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "questions_per_minute": round(len(latencies) / elapsed * 60, 2),
+            "mean": round(statistics.mean(latencies), 3),
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "max": max(latencies),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a file of questions")
+    parser.add_argument("questions", help="text file, one question per line")
+    parser.add_argument("--output", default="results.jsonl")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument(
+        "--trace", action="store_true", help="record spans with TracingHandler"
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    callbacks = [TracingHandler()] if args.trace else None
+
+    runner = BatchRunner(workers=args.workers, callbacks=callbacks)
+    with open(args.output, "w") as output:
+        summary = runner.run(read_questions(args.questions), output)
+    print(json.dumps(summary, indent=2))
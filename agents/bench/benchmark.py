@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from bench.generate import generate
+
+WORKLOADS = {
+    "count": "SELECT COUNT(*) FROM orders",
+    "join": (
+        "SELECT COUNT(DISTINCT u.id) FROM users u "
+        "JOIN addresses a ON a.user_id = u.id"
+    ),
+    "join_group": (
+        "SELECT u.name, COUNT(o.id) AS total FROM users u "
+        "JOIN orders o ON o.user_id = u.id "
+        "GROUP BY u.id ORDER BY total DESC LIMIT 10"
+    ),
+    "top_n": (
+        "SELECT p.name, SUM(op.amount) AS total FROM order_products op "
+        "JOIN products p ON p.id = op.product_id "
+        "GROUP BY p.id ORDER BY total DESC LIMIT 5"
+    ),
+    "first_page": "SELECT * FROM order_products",
+}
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "p50_ms": statistics.median(timings) * 1000,
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+    }
+
+
+def run(repeat):
+    # Runs inside the child process, SQLITE_DB_PATH points to the database
+    from tools.sql import describe_tables, run_sqlite_query, tables
+
+    results = {
+        "tables": measure(tables, repeat),
+        "describe_tables": measure(
+            lambda: describe_tables(["users", "orders", "order_products"]), repeat
+        ),
+    }
+    for name, query in WORKLOADS.items():
+        results[name] = measure(lambda: run_sqlite_query(query), repeat)
+
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    return {"results": results, "peak_rss_mb": round(peak / 1024, 1)}
+
+
+def run_scale(path, repeat, cache):
+    # A new process per database: the pool is created at import time and
+    # peak RSS must not include the previous scales
+    env = dict(os.environ, SQLITE_DB_PATH=path, SQLITE_INDEX_ADVISOR="off")
+    if not cache:
+        env["SQLITE_CACHE_SIZE"] = "0"
+    output = subprocess.run(
+        [sys.executable, "-m", "bench.benchmark", "--child", "--repeat", str(repeat)],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def print_report(scale, report):
+    print(f"\n=== scale {scale:g}x (peak RSS {report['peak_rss_mb']} MB)")
+    print(f"{'workload':<16}{'p50 ms':>12}{'p95 ms':>12}")
+    for name, timing in report["results"].items():
+        print(f"{name:<16}{timing['p50_ms']:>12.3f}{timing['p95_ms']:>12.3f}")
+
+
+if __name__ == "__main__":
+    # From the agents folder: python -m bench.benchmark --scales 1 10 100
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=float, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--cache", action="store_true", help="keep the query cache")
+    parser.add_argument("--output", help="also write the results to a JSON file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run(args.repeat)))
+        sys.exit()
+
+    reports = {}
+    for scale in args.scales:
+        path = os.path.abspath(os.path.join("bench", f"db_{scale:g}x.sqlite"))
+        if not os.path.exists(path):
+            print(f"Generating {path}...")
+            generate(path, scale)
+        reports[f"{scale:g}x"] = run_scale(path, args.repeat, args.cache)
+        print_report(scale, reports[f"{scale:g}x"])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
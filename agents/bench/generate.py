@@ -0,0 +1,172 @@
+import argparse
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+# Row counts of the bundled db.sqlite, multiplied by --scale
+BASE_ROWS = {
+    "users": 2000,
+    "addresses": 4015,
+    "products": 4000,
+    "carts": 3978,
+    "orders": 1500,
+    "order_products": 8185,
+}
+BATCH_SIZE = 10_000
+
+SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    email TEXT UNIQUE,
+    password TEXT
+    );
+CREATE TABLE addresses (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    address TEXT
+    );
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    price REAL
+    );
+CREATE TABLE carts (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    product_id INTEGER,
+    quantity INTEGER
+    );
+CREATE TABLE orders (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    created TEXT
+    );
+CREATE TABLE order_products (
+    id INTEGER PRIMARY KEY,
+    order_id INTEGER,
+    product_id INTEGER,
+    amount INTEGER
+    );
+"""
+
+FIRST_NAMES = (
+    "James Mary Robert Patricia John Jennifer Michael Linda David Elizabeth "
+    "William Barbara Richard Susan Joseph Jessica Thomas Sarah Marvin Karen"
+).split()
+LAST_NAMES = (
+    "Smith Johnson Williams Brown Jones Garcia Miller Davis Rodriguez Martinez "
+    "Hernandez Lopez Gonzalez Wilson Anderson Thomas Taylor Moore Mejia Randolph"
+).split()
+ADJECTIVES = (
+    "Frozen Intelligent Soft Rustic Small Ergonomic Handmade Gorgeous Practical "
+    "Sleek Fresh Generic"
+).split()
+NOUNS = (
+    "Towels Soap Car Chair Table Shoes Hat Keyboard Mouse Gloves Cheese Bike".split()
+)
+STREETS = "Harrison Gardens Main Oak Pine Maple Cedar Elm Washington Lake Hill".split()
+START = datetime(2024, 1, 1)
+
+
+def users(rng, count):
+    for i in range(1, count + 1):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        password = "".join(rng.choices("abcdefghijkXYZ0123456789%*", k=10))
+        yield (i, name, f"user{i}@example.com", password)
+
+
+def addresses(rng, count, n_users):
+    for i in range(1, count + 1):
+        number, zip_code = rng.randint(1, 99999), rng.randint(10000, 99999)
+        address = f"{number} {rng.choice(STREETS)} Street, FL {zip_code}"
+        yield (i, rng.randint(1, n_users), address)
+
+
+def products(rng, count):
+    for i in range(1, count + 1):
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}"
+        yield (i, name, round(rng.uniform(1, 1000), 2))
+
+
+def carts(rng, count, n_users, n_products):
+    for i in range(1, count + 1):
+        yield (
+            i,
+            rng.randint(1, n_users),
+            rng.randint(1, n_products),
+            rng.randint(1, 5),
+        )
+
+
+def orders(rng, count, n_users):
+    for i in range(1, count + 1):
+        created = START + timedelta(days=rng.randint(0, 3 * 365))
+        yield (i, rng.randint(1, n_users), created.strftime("%Y-%m-%d %H:%M:%S"))
+
+
+def order_products(rng, count, n_orders, n_products):
+    for i in range(1, count + 1):
+        yield (
+            i,
+            rng.randint(1, n_orders),
+            rng.randint(1, n_products),
+            rng.randint(1, 10),
+        )
+
+
+def generate(path, scale=1, seed=42):
+    # Same seed and scale always produce the same database
+    rows = {table: int(count * scale) for table, count in BASE_ROWS.items()}
+    rng = random.Random(seed)
+    generators = [
+        ("users", users(rng, rows["users"])),
+        ("addresses", addresses(rng, rows["addresses"], rows["users"])),
+        ("products", products(rng, rows["products"])),
+        ("carts", carts(rng, rows["carts"], rows["users"], rows["products"])),
+        ("orders", orders(rng, rows["orders"], rows["users"])),
+        (
+            "order_products",
+            order_products(
+                rng, rows["order_products"], rows["orders"], rows["products"]
+            ),
+        ),
+    ]
+
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    # Nothing to protect while the file is being built
+    conn.execute("PRAGMA journal_mode=OFF;")
+    conn.execute("PRAGMA synchronous=OFF;")
+    conn.executescript(SCHEMA)
+    for table, values in generators:
+        batch = []
+        for row in values:
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                insert(conn, table, batch)
+                batch = []
+        if batch:
+            insert(conn, table, batch)
+    conn.commit()
+    conn.close()
+    return rows
+
+
+def insert(conn, table, rows):
+    placeholders = ", ".join(["?"] * len(rows[0]))
+    conn.executemany(f"INSERT INTO {table} VALUES ({placeholders});", rows)
+
+
+if __name__ == "__main__":
+    # From the agents folder: python -m bench.generate --scale 10
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    output = args.output or os.path.join("bench", f"db_{args.scale:g}x.sqlite")
+    print(generate(output, args.scale, args.seed))
@@ -0,0 +1,184 @@
+import base64
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from langchain.tools import StructuredTool
+from pydantic.v1 import BaseModel
+from report import STYLE, cell
+from report_store import report_store
+from tools.cache import normalize_sql
+from tools.db import pool
+from tools.sql import run_sqlite_query_columnar
+
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", ".chart_cache")
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", 2))
+KINDS = ("bar", "line", "histogram")
+FORMATS = ("png", "svg")
+
+# Matplotlib runs in these processes, a chart never holds the GIL of the agent.
+# They come from a forkserver: forking this process, which has several threads
+# by then, could leave a worker stuck on a copied lock. The workers import
+# this module too, so the pool is only created on the first chart.
+_chart_executor = None
+_chart_executor_lock = threading.Lock()
+
+
+def chart_executor():
+    global _chart_executor
+    with _chart_executor_lock:
+        if _chart_executor is None:
+            _chart_executor = ProcessPoolExecutor(
+                max_workers=CHART_WORKERS,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return _chart_executor
+
+
+def render_chart(kind, x, y, x_label, y_label, title, image_format):
+    # Runs in a worker process
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 4.5))
+    if kind == "histogram":
+        ax.hist(x, bins=min(50, max(1, len(x) // 10)))
+        ax.set_ylabel("count")
+    elif kind == "bar":
+        ax.bar([str(value) for value in x], y)
+        ax.set_ylabel(y_label)
+        if len(x) > 10:
+            ax.tick_params(axis="x", labelrotation=90)
+    else:
+        ax.plot(x, y, marker="o" if len(x) <= 50 else None)
+        ax.set_ylabel(y_label)
+    ax.set_xlabel(x_label)
+    ax.set_title(title)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=image_format, bbox_inches="tight")
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def data_version():
+    # Files of the database (mtime and size), unlike PRAGMA data_version it
+    # means the same in every process and run
+    return repr(pool.version()[1])
+
+
+def chart_key(query, kind, x, y, title, image_format):
+    data = json.dumps(
+        [normalize_sql(query), kind, x, y, title, image_format, data_version()]
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def embed(image, image_format):
+    if image_format == "svg":
+        # Without the XML prolog so it can go inline
+        svg = image.decode()
+        return svg[svg.index("<svg") :]
+    return '<img src="data:image/png;base64,' + base64.b64encode(image).decode() + '">'
+
+
+def chart(query, kind, x, y, title, image_format):
+    # Returns (chart html, rows, cached) or an error message, the rendered
+    # chart is kept on disk until the query or the data changes
+    key = chart_key(query, kind, x, y, title, image_format)
+    path = os.path.join(CHART_CACHE_DIR, key + ".json")
+    if os.path.exists(path):
+        with open(path) as f:
+            cached = json.load(f)
+        return cached["html"], cached["rows"], True
+
+    columns = run_sqlite_query_columnar(query)
+    if isinstance(columns, str):
+        return columns
+    names = list(columns)
+    if not names:
+        return "The query returned no columns"
+    x = x or names[0]
+    y = y or (names[1] if len(names) > 1 else names[0])
+    for name in (x, y):
+        if name not in columns:
+            return f"Unknown column '{name}', the query returns: {', '.join(names)}"
+
+    image = (
+        chart_executor()
+        .submit(
+            render_chart,
+            kind,
+            columns[x],
+            columns[y],
+            x,
+            y,
+            title,
+            image_format,
+        )
+        .result()
+    )
+    html = embed(image, image_format)
+    rows = len(columns[x])
+
+    os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"html": html, "rows": rows}, f)
+    os.replace(path + ".tmp", path)
+    return html, rows, False
+
+
+def write_chart_report(
+    filename, query, kind="bar", x=None, y=None, title="Chart", image_format="png"
+):
+    if kind not in KINDS:
+        return f"Unknown chart '{kind}', use one of: {', '.join(KINDS)}"
+    if image_format not in FORMATS:
+        return f"Unknown format '{image_format}', use one of: {', '.join(FORMATS)}"
+
+    result = chart(query, kind, x, y, title, image_format)
+    if isinstance(result, str):
+        return result
+    html, rows, cached = result
+    entry = report_store.save(
+        filename,
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>{cell(title)}</title><style>{STYLE}</style></head>"
+        f"<body><h1>{cell(title)}</h1>\n{html}\n</body></html>\n",
+    )
+    return {
+        "filename": filename,
+        "chart": kind,
+        "rows": rows,
+        "cached": cached,
+        "hash": entry["hash"],
+    }
+
+
+class WriteChartReportArgsSchema(BaseModel):
+    filename: str
+    query: str
+    kind: str = "bar"
+    x: Optional[str] = None
+    y: Optional[str] = None
+    title: str = "Chart"
+    image_format: str = "png"
+
+
+write_chart_report_tool = StructuredTool.from_function(
+    name="write_chart_report",
+    description=(
+        "Run a SQLite query and write an HTML report with a chart of the "
+        "result. kind is 'bar', 'line' or 'histogram' (of column x). x and y "
+        "are column names of the query, by default the first and second. "
+        "image_format is 'png' or 'svg'."
+    ),
+    func=write_chart_report,
+    args_schema=WriteChartReportArgsSchema,
+)
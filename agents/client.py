@@ -0,0 +1,44 @@
+import argparse
+import json
+import os
+import socket
+import sys
+
+# Only the standard library, the client starts right away and the daemon
+# does the rest
+AGENT_SOCKET = os.getenv("AGENT_SOCKET", "agent.sock")
+
+
+def ask(connection, reader, question, session=""):
+    request = {"question": question, "session": session}
+    connection.sendall((json.dumps(request) + "\n").encode())
+    return json.loads(reader.readline())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ask the SQL agent daemon")
+    parser.add_argument("question", nargs="?", help="without it, read from stdin")
+    parser.add_argument("--socket", default=AGENT_SOCKET)
+    parser.add_argument(
+        "--session", default=str(os.getpid()), help="same session, same memory"
+    )
+    args = parser.parse_args()
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(args.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sys.exit(f"No daemon on {args.socket}, start it with: python daemon.py")
+
+    reader = connection.makefile()
+    questions = [args.question] if args.question else sys.stdin
+    for question in questions:
+        if not question.strip():
+            continue
+        response = ask(connection, reader, question.strip(), args.session)
+        if "error" in response:
+            print(f"Error: {response['error']}", file=sys.stderr)
+        else:
+            print(response["output"])
+        print(f"({response['seconds']}s)", file=sys.stderr)
+    connection.close()
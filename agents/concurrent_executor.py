@@ -0,0 +1,152 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from langchain.agents import AgentExecutor
+from langchain.agents.agent import ExceptionTool
+from langchain.agents.tools import InvalidTool
+from langchain.schema import OutputParserException
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", 4))
+# Tools that only read, several calls of them in one step can't affect each other
+READ_ONLY_TOOLS = ["run_sqlite_query", "fetch_next_page", "describe_tables"]
+
+tool_executor = ThreadPoolExecutor(
+    max_workers=TOOL_CONCURRENCY, thread_name_prefix="tool"
+)
+
+
+class ConcurrentAgentExecutor(AgentExecutor):
+    # AgentExecutor that runs the tool calls of one step at the same time when
+    # the agent asks for more than one (e.g. OpenAIMultiFunctionsAgent), so a
+    # step takes as long as its slowest tool instead of the sum of all.
+    # Observations are returned in the order of the calls. Tools outside
+    # concurrent_tools (None means all) run one by one in this thread. The
+    # async path (arun) already gathers the calls in AgentExecutor.
+    concurrent_tools: Optional[List[str]] = READ_ONLY_TOOLS
+
+    def _run_action(self, name_to_tool_map, color_mapping, action, run_manager):
+        callbacks = run_manager.get_child() if run_manager else None
+        tool_run_kwargs = self.agent.tool_run_logging_kwargs()
+        if action.tool not in name_to_tool_map:
+            observation = InvalidTool().run(
+                {
+                    "requested_tool_name": action.tool,
+                    "available_tool_names": list(name_to_tool_map.keys()),
+                },
+                verbose=self.verbose,
+                color=None,
+                callbacks=callbacks,
+                **tool_run_kwargs,
+            )
+            return AgentStep(action=action, observation=observation)
+
+        tool = name_to_tool_map[action.tool]
+        if tool.return_direct:
+            tool_run_kwargs["llm_prefix"] = ""
+        observation = tool.run(
+            action.tool_input,
+            verbose=self.verbose,
+            color=color_mapping[action.tool],
+            callbacks=callbacks,
+            **tool_run_kwargs,
+        )
+        return AgentStep(action=action, observation=observation)
+
+    def _parsing_error_step(self, e, run_manager):
+        if isinstance(self.handle_parsing_errors, bool):
+            raise_error = not self.handle_parsing_errors
+        else:
+            raise_error = False
+        if raise_error:
+            raise ValueError(
+                "An output parsing error occurred. "
+                "In order to pass this error back to the agent and have it try "
+                "again, pass `handle_parsing_errors=True` to the AgentExecutor. "
+                f"This is the error: {str(e)}"
+            )
+        text = str(e)
+        if isinstance(self.handle_parsing_errors, bool):
+            if e.send_to_llm:
+                observation = str(e.observation)
+                text = str(e.llm_output)
+            else:
+                observation = "Invalid or incomplete response"
+        elif isinstance(self.handle_parsing_errors, str):
+            observation = self.handle_parsing_errors
+        elif callable(self.handle_parsing_errors):
+            observation = self.handle_parsing_errors(e)
+        else:
+            raise ValueError("Got unexpected type of `handle_parsing_errors`")
+        output = AgentAction("_Exception", observation, text)
+        if run_manager:
+            run_manager.on_agent_action(output, color="green")
+        observation = ExceptionTool().run(
+            output.tool_input,
+            verbose=self.verbose,
+            color=None,
+            callbacks=run_manager.get_child() if run_manager else None,
+            **self.agent.tool_run_logging_kwargs(),
+        )
+        return AgentStep(action=output, observation=observation)
+
+    def _is_concurrent(self, action):
+        return self.concurrent_tools is None or action.tool in self.concurrent_tools
+
+    def _iter_next_step(
+        self,
+        name_to_tool_map,
+        color_mapping,
+        inputs,
+        intermediate_steps,
+        run_manager=None,
+    ):
+        try:
+            output = self.agent.plan(
+                self._prepare_intermediate_steps(intermediate_steps),
+                callbacks=run_manager.get_child() if run_manager else None,
+                **inputs,
+            )
+        except OutputParserException as e:
+            # Same as AgentExecutor, without planning again
+            yield self._parsing_error_step(e, run_manager)
+            return
+
+        if isinstance(output, AgentFinish):
+            yield output
+            return
+
+        actions = [output] if isinstance(output, AgentAction) else output
+        for action in actions:
+            yield action
+        for action in actions:
+            if run_manager:
+                run_manager.on_agent_action(action, color="green")
+
+        concurrent = [a for a in actions if self._is_concurrent(a)]
+        futures = {}
+        if len(concurrent) > 1:
+            futures = {
+                id(action): tool_executor.submit(
+                    self._run_action,
+                    name_to_tool_map,
+                    color_mapping,
+                    action,
+                    run_manager,
+                )
+                for action in concurrent
+            }
+        # The rest runs here while the concurrent ones are in flight
+        steps = {
+            id(action): self._run_action(
+                name_to_tool_map, color_mapping, action, run_manager
+            )
+            for action in actions
+            if id(action) not in futures
+        }
+        for action in actions:
+            if id(action) in futures:
+                yield futures[id(action)].result()
+            else:
+                yield steps[id(action)]
@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from handlers.tracing_handler import TracingHandler
+from sql_agent import build_agent, build_agent_executor
+from tools.catalog import catalog
+
+AGENT_SOCKET = os.getenv("AGENT_SOCKET", "agent.sock")
+MAX_SESSIONS = int(os.getenv("AGENT_MAX_SESSIONS", 64))
+
+
+class Sessions:
+    # session name -> executor with its own memory, the least recently used
+    # one is dropped when there are too many
+    def __init__(self, agent, maxsize=MAX_SESSIONS):
+        self.agent = agent
+        self.maxsize = maxsize
+        self._executors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._executors:
+                self._executors[name] = (
+                    build_agent_executor(self.agent),
+                    threading.Lock(),
+                )
+                while len(self._executors) > self.maxsize:
+                    self._executors.popitem(last=False)
+            self._executors.move_to_end(name)
+            return self._executors[name]
+
+
+class AgentRequestHandler(socketserver.StreamRequestHandler):
+    # One JSON object per line: {"question": ..., "session": ...} and the
+    # answer {"output": ..., "seconds": ...} or {"error": ...} on its own line
+    def handle(self):
+        for line in self.rfile:
+            started = time.perf_counter()
+            try:
+                request = json.loads(line)
+                executor, lock = self.server.sessions.get(request.get("session", ""))
+                # Questions of the same session go one after the other, they
+                # share the memory
+                with lock:
+                    output = executor.run(
+                        request["question"], callbacks=self.server.callbacks
+                    )
+                response = {"output": output}
+            except Exception as e:
+                response = {"error": repr(e)}
+            response["seconds"] = round(time.perf_counter() - started, 3)
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            self.wfile.flush()
+
+
+class AgentServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path=AGENT_SOCKET, trace=False, chat=None):
+    # Everything a question needs is loaded here once: langchain, the prompt
+    # with the table names, the agent and the schema catalog
+    started = time.perf_counter()
+    catalog.refresh()
+    agent = build_agent(chat)
+    if os.path.exists(path):
+        os.remove(path)
+    server = AgentServer(path, AgentRequestHandler)
+    server.sessions = Sessions(agent)
+    server.callbacks = [TracingHandler()] if trace else None
+    print(f"Ready in {time.perf_counter() - started:.2f}s on {path}")
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the SQL agent")
+    parser.add_argument("--socket", default=AGENT_SOCKET)
+    parser.add_argument("--trace", action="store_true")
+    args = parser.parse_args()
+
+    load_dotenv()
+    server = serve(args.socket, args.trace)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(args.socket)
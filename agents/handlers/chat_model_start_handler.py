@@ -1,30 +1,74 @@
+import atexit
+import queue
+import threading
+from collections import Counter
+
 from langchain.callbacks.base import BaseCallbackHandler
 from pyboxen import boxen
 
 
-def boxen_print(*args, **kwargs):
-    print(boxen(*args, **kwargs))
+def render(message):
+    if message.type == "system":
+        return boxen(message.content, title=message.type, color="yellow")
+    elif message.type == "human":
+        return boxen(message.content, title=message.type, color="green")
+    elif message.type == "ai" and "function_call" in message.additional_kwargs:
+        call = message.additional_kwargs["function_call"]
+        return boxen(
+            f"Running tool {call['name']} with args {call['arguments']}",
+            title=message.type,
+            color="cyan",
+        )
+    elif message.type == "ai":
+        return boxen(message.content, title=message.type, color="blue")
+    elif message.type == "function":
+        return boxen(message.content, title=message.type, color="purple")
+    else:
+        return boxen(message.content, title=message.type)
+
+
+def message_key(message):
+    return (message.type, message.content, str(message.additional_kwargs))
 
 
 class ChatModelStartHandler(BaseCallbackHandler):
+    # Every call sends the whole conversation again, only the messages that
+    # were not printed before are shown. They are tracked by content, not by
+    # position: the schema message and the memory change the start of the
+    # list. Rendering and printing happen in a background thread so the agent
+    # never waits for the terminal.
+    def __init__(self):
+        # message key -> how many times it was printed (a question can be
+        # asked twice)
+        self._shown = Counter()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        threading.Thread(target=self._print_loop, daemon=True).start()
+        atexit.register(self.flush)
+
     def on_chat_model_start(self, serialized, messages, **kwargs):
-        print("\n\n =========== Sending Messages ================\n\n")
-
-        for message in messages[0]:
-            if message.type == "system":
-                boxen_print(message.content, title=message.type, color="yellow")
-            elif message.type == "human":
-                boxen_print(message.content, title=message.type, color="green")
-            elif message.type == "ai" and "function_call" in message.additional_kwargs:
-                call = message.additional_kwargs["function_call"]
-                boxen_print(
-                    f"Running tool {call['name']} with args {call['arguments']}",
-                    title=message.type,
-                    color="cyan",
-                )
-            elif message.type == "ai":
-                boxen_print(message.content, title=message.type, color="blue")
-            elif message.type == "function":
-                boxen_print(message.content, title=message.type, color="purple")
-            else:
-                boxen_print(message.content, title=message.type)
+        new_messages = []
+        seen = Counter()
+        with self._lock:
+            for message in messages[0]:
+                key = message_key(message)
+                seen[key] += 1
+                if seen[key] > self._shown[key]:
+                    self._shown[key] = seen[key]
+                    new_messages.append(message)
+        if new_messages:
+            self._queue.put(new_messages)
+
+    def _print_loop(self):
+        while True:
+            new_messages = self._queue.get()
+            try:
+                print("\n\n =========== Sending Messages ================\n\n")
+                for message in new_messages:
+                    print(render(message))
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        # Waits until everything queued was printed
+        self._queue.join()
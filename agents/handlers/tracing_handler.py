@@ -0,0 +1,144 @@
+import os
+import sqlite3
+import threading
+import time
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+TRACE_DB_PATH = os.getenv("TRACE_DB_PATH", "traces.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spans (
+    span_id TEXT PRIMARY KEY,
+    trace_id TEXT,
+    parent_id TEXT,
+    kind TEXT,
+    name TEXT,
+    question TEXT,
+    started REAL,
+    ended REAL,
+    duration_ms REAL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_tokens INTEGER,
+    error TEXT
+    );
+CREATE INDEX IF NOT EXISTS spans_trace_id ON spans (trace_id);
+"""
+
+
+class TraceStore:
+    def __init__(self, path=TRACE_DB_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO spans VALUES "
+                "(:span_id, :trace_id, :parent_id, :kind, :name, :question, "
+                ":started, :ended, :duration_ms, :prompt_tokens, "
+                ":completion_tokens, :total_tokens, :error);",
+                span,
+            )
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+
+class TracingHandler(BaseCallbackHandler):
+    # Records one span per chain, LLM call and tool call with its parent,
+    # duration and token usage. Pass it when running so it reaches the
+    # nested runs: agent_executor.run(question, callbacks=[TracingHandler()])
+    def __init__(self, store=None):
+        self.store = store or TraceStore()
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def _start(self, kind, name, run_id, parent_run_id, question=None):
+        with self._lock:
+            parent = self._open.get(parent_run_id)
+            self._open[run_id] = {
+                "span_id": str(run_id),
+                "trace_id": parent["trace_id"] if parent else str(run_id),
+                "parent_id": str(parent_run_id) if parent_run_id else None,
+                "kind": kind,
+                "name": name,
+                "question": question or (parent and parent["question"]),
+                "started": time.time(),
+                "ended": None,
+                "duration_ms": None,
+                "prompt_tokens": None,
+                "completion_tokens": None,
+                "total_tokens": None,
+                "error": None,
+            }
+
+    def _end(self, run_id, error=None, token_usage=None):
+        with self._lock:
+            span = self._open.pop(run_id, None)
+        if span is None:
+            return
+        span["ended"] = time.time()
+        span["duration_ms"] = (span["ended"] - span["started"]) * 1000
+        span["error"] = repr(error) if error else None
+        for key, value in (token_usage or {}).items():
+            if key in span:
+                span[key] = value
+        self.store.add(span)
+
+    @staticmethod
+    def _name(serialized, kwargs):
+        if kwargs.get("name"):
+            return kwargs["name"]
+        serialized = serialized or {}
+        return serialized.get("name") or (serialized.get("id") or ["unknown"])[-1]
+
+    def on_chain_start(
+        self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs
+    ):
+        question = None
+        if isinstance(inputs, dict):
+            question = (
+                inputs.get("input") or inputs.get("query") or inputs.get("question")
+            )
+        self._start(
+            "chain", self._name(serialized, kwargs), run_id, parent_run_id, question
+        )
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_llm_start(
+        self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs
+    ):
+        self._start("llm", self._name(serialized, kwargs), run_id, parent_run_id)
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, parent_run_id=None, **kwargs
+    ):
+        self._start("llm", self._name(serialized, kwargs), run_id, parent_run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage")
+        self._end(run_id, token_usage=usage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_tool_start(
+        self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs
+    ):
+        self._start("tool", self._name(serialized, kwargs), run_id, parent_run_id)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
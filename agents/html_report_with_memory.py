@@ -2,13 +2,13 @@ import langchain
 from dotenv import load_dotenv
 from langchain.agents import AgentExecutor, OpenAIFunctionsAgent
 from langchain.chat_models import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
 from langchain.prompts import (
     ChatPromptTemplate,
     HumanMessagePromptTemplate,
     MessagesPlaceholder,
 )
 from langchain.schema import SystemMessage
+from memory.token_budget_memory import TokenBudgetMemory
 from report import write_report_tool
 from tools.sql import describe_tables_tool, run_query_tool, tables
 
@@ -36,7 +36,10 @@ prompt = ChatPromptTemplate(
 )
 
 # return_messages return the result as string
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+# Keeps the history under a token budget so every turn costs about the same
+memory = TokenBudgetMemory(
+    memory_key="chat_history", return_messages=True, max_tokens=2000
+)
 tools = [run_query_tool, describe_tables_tool, write_report_tool]
 agent = OpenAIFunctionsAgent(
     llm=chat,
@@ -1,58 +1,31 @@
 from dotenv import load_dotenv
 from handlers.chat_model_start_handler import ChatModelStartHandler
-from langchain.agents import AgentExecutor, OpenAIFunctionsAgent
+from handlers.tracing_handler import TracingHandler
 from langchain.chat_models import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
-from langchain.prompts import (
-    ChatPromptTemplate,
-    HumanMessagePromptTemplate,
-    MessagesPlaceholder,
-)
-from langchain.schema import SystemMessage
-from report import write_report_tool
-from tools.sql import describe_tables_tool, run_query_tool, tables
+from sql_agent import build_agent, build_agent_executor
 
 load_dotenv()
 # langchain.debug = True
 
 handler = ChatModelStartHandler()
+# Passed to each run so every nested chain, LLM and tool call gets a span
+tracer = TracingHandler()
 chat = ChatOpenAI(callbacks=[handler])
-tables = tables()
-prompt = ChatPromptTemplate(
-    input_variables=["input"],
-    messages=[
-        SystemMessage(
-            content=(
-                "You are an AI that has access to a SQLite database.\n"
-                f"The database has tables of: {tables}\n"
-                "Do not make any assumptions about what tables exist"
-                "or what columns exist. Instead, use the 'describe_tables' function"
-            )
-        ),
-        # chat_history match with the ConversarionBufferMemory key
-        MessagesPlaceholder(variable_name="chat_history"),
-        HumanMessagePromptTemplate.from_template("{input}"),
-        # This is by convention and we need it. (Similar to memory)
-        MessagesPlaceholder(variable_name="agent_scratchpad"),
-    ],
-)
-
-# return_messages return the result as string
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-tools = [run_query_tool, describe_tables_tool, write_report_tool]
-agent = OpenAIFunctionsAgent(
-    llm=chat,
-    prompt=prompt,
-    tools=tools,
-)
-
-agent_executor = AgentExecutor(agent=agent, verbose=True, tools=tools, memory=memory)
-
-# agent_executor.run("How many users have provided a shipping address?")
-# agent_executor.run("How many users are in the database?")
-agent_executor.run("How many orders are there? Write the result to an html report.")
-
-agent_executor.run("Repeat the exact same process for users")
+# Prompt, tools and memory are built in sql_agent, the batch runner uses the
+# same setup
+agent_executor = build_agent_executor(build_agent(chat), verbose=True)
+
+# The chart workers import this module again, they must not run the agent
+if __name__ == "__main__":
+    # agent_executor.run("How many users have provided a shipping address?")
+    # agent_executor.run("How many users are in the database?")
+    agent_executor.run(
+        "How many orders are there? Write the result to an html report.",
+        callbacks=[tracer],
+    )
+
+    # report_jobs.py can repeat a recorded run like this one without the model
+    agent_executor.run("Repeat the exact same process for users", callbacks=[tracer])
 
 # output before adding pyboxen:
 # > Entering new AgentExecutor chain...
@@ -0,0 +1,77 @@
+from typing import Any, Dict, List
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.schema.messages import BaseMessage, get_buffer_string
+from token_counter import encoding_for, token_counter
+
+MARKER = " [...]"
+
+
+class TokenBudgetMemory(BaseChatMemory):
+    # Chat history that never goes over max_tokens (counted by token_counter).
+    # When it does, the oldest turns are compacted first (long messages cut
+    # to compact_to tokens) and then dropped, oldest first. The last
+    # keep_last exchanges are always kept whole. The system prompt is part of
+    # the prompt template, not of the memory, so it is never removed.
+    memory_key: str = "history"
+    human_prefix: str = "Human"
+    ai_prefix: str = "AI"
+    max_tokens: int = 2000
+    keep_last: int = 2
+    compact_to: int = 100
+    model_name: str = "gpt-3.5-turbo"
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages = self.chat_memory.messages
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {
+            self.memory_key: get_buffer_string(
+                messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix
+            )
+        }
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        messages = self.chat_memory.messages
+        trimmed = self.trim(messages)
+        if trimmed != messages:
+            self.chat_memory.clear()
+            for message in trimmed:
+                self.chat_memory.add_message(message)
+
+    def _compact(self, message: BaseMessage) -> BaseMessage:
+        encoding = encoding_for(self.model_name)
+        tokens = encoding.encode(message.content)
+        if len(tokens) <= self.compact_to:
+            return message
+        content = encoding.decode(tokens[: self.compact_to]) + MARKER
+        return message.copy(update={"content": content})
+
+    def trim(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        counts = token_counter.count_messages(messages, self.model_name)
+        total = sum(counts)
+        if total <= self.max_tokens:
+            return messages
+
+        # Every exchange is a human + ai message
+        protected = len(messages) - 2 * self.keep_last
+        messages = list(messages)
+        for i in range(max(protected, 0)):
+            if total <= self.max_tokens:
+                return messages
+            messages[i] = self._compact(messages[i])
+            new_count = token_counter.count_message(messages[i], self.model_name)
+            total -= counts[i] - new_count
+            counts[i] = new_count
+
+        # Drop whole exchanges so the history never starts with an AI message
+        start = 0
+        while total > self.max_tokens and start + 2 <= protected:
+            total -= counts[start] + counts[start + 1]
+            start += 2
+        return messages[start:]
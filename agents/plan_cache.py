@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from langchain.agents import OpenAIFunctionsAgent
+from langchain.agents.output_parsers.openai_functions import (
+    OpenAIFunctionsAgentOutputParser,
+)
+from langchain.pydantic_v1 import Field
+from langchain.schema import AgentFinish
+from langchain.schema.messages import AIMessage, get_buffer_string
+from tools.budget import ERROR_PREFIXES
+from tools.catalog import catalog
+
+PLAN_CACHE_PATH = os.getenv("PLAN_CACHE_PATH")
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", 256))
+
+
+def normalize_question(question):
+    return re.sub(r"\s+", " ", question).strip().rstrip("?.!").lower()
+
+
+class PlanCache:
+    # question + schema version -> function calls the model made to answer it,
+    # optionally persisted to a JSON file
+    def __init__(self, path=PLAN_CACHE_PATH, maxsize=PLAN_CACHE_SIZE):
+        self.path = path
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._plans.update(json.load(f))
+
+    def key(self, question, history=None):
+        catalog.refresh()
+        key = f"{catalog.version}:{normalize_question(question)}"
+        if history:
+            # A follow up ("the same for users") means something else in
+            # another conversation
+            digest = hashlib.sha256(get_buffer_string(history).encode())
+            key += f":{digest.hexdigest()[:16]}"
+        return key
+
+    def get(self, key):
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+            return plan
+
+    def put(self, key, plan):
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+            if self.path:
+                # Write and rename so a crash never leaves half a file
+                with open(self.path + ".tmp", "w") as f:
+                    json.dump(self._plans, f)
+                os.replace(self.path + ".tmp", self.path)
+
+
+plan_cache = PlanCache()
+
+
+class PlanCachingAgent(OpenAIFunctionsAgent):
+    # OpenAIFunctionsAgent that records the tool calls used to answer a
+    # question. When the same question is asked again the calls are replayed
+    # without asking the model as long as every tool returns what it returned
+    # last time: the arguments of a call (e.g. the html of a report) were
+    # written from the previous observations. On the first difference the
+    # model takes over. The model only writes the final answer, or not even
+    # that when replay_answer is on.
+    plan_cache: Any = Field(default_factory=lambda: plan_cache)
+    replay_answer: bool = False
+
+    def _replay(self, intermediate_steps, key):
+        plan = self.plan_cache.get(key)
+        step = len(intermediate_steps)
+        if plan is None or step > len(plan["calls"]):
+            return None
+        for (action, observation), call, recorded in zip(
+            intermediate_steps, plan["calls"], plan["observations"]
+        ):
+            if action.tool != call["function_call"]["name"]:
+                return None
+            if (
+                str(observation).startswith(ERROR_PREFIXES)
+                or str(observation) != recorded
+            ):
+                return None
+
+        if step < len(plan["calls"]):
+            call = plan["calls"][step]
+            message = AIMessage(
+                content=call["content"],
+                additional_kwargs={"function_call": call["function_call"]},
+            )
+            return OpenAIFunctionsAgentOutputParser._parse_ai_message(message)
+
+        if self.replay_answer:
+            return AgentFinish(return_values={"output": plan["output"]}, log="")
+        return None
+
+    def _record(self, intermediate_steps, key, decision):
+        if not isinstance(decision, AgentFinish):
+            return
+        calls = []
+        for action, _ in intermediate_steps:
+            if not getattr(action, "message_log", None):
+                # Not a function call of the model (e.g. a parsing error)
+                return
+            message = action.message_log[0]
+            calls.append(
+                {
+                    "content": message.content,
+                    "function_call": message.additional_kwargs["function_call"],
+                }
+            )
+        self.plan_cache.put(
+            key,
+            {
+                "calls": calls,
+                "observations": [str(obs) for _, obs in intermediate_steps],
+                "output": decision.return_values["output"],
+            },
+        )
+
+    def plan(self, intermediate_steps, callbacks=None, with_functions=True, **kwargs):
+        key = self.plan_cache.key(kwargs["input"], kwargs.get("chat_history"))
+        decision = self._replay(intermediate_steps, key)
+        if decision is not None:
+            self.plan_cache.hits += 1
+            return decision
+
+        self.plan_cache.misses += 1
+        decision = super().plan(
+            intermediate_steps,
+            callbacks=callbacks,
+            with_functions=with_functions,
+            **kwargs,
+        )
+        self._record(intermediate_steps, key, decision)
+        return decision
+
+    async def aplan(self, intermediate_steps, callbacks=None, **kwargs):
+        key = self.plan_cache.key(kwargs["input"], kwargs.get("chat_history"))
+        decision = self._replay(intermediate_steps, key)
+        if decision is not None:
+            self.plan_cache.hits += 1
+            return decision
+
+        self.plan_cache.misses += 1
+        decision = await super().aplan(
+            intermediate_steps, callbacks=callbacks, **kwargs
+        )
+        self._record(intermediate_steps, key, decision)
+        return decision
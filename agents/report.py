@@ -1,10 +1,16 @@
+import html
+import sqlite3
+
 from langchain.tools import StructuredTool
 from pydantic.v1 import BaseModel
+from report_store import report_store
+from tools.budget import QUERY_ERROR, default_budget
+from tools.db import pool
+from tools.pages import FETCH_SIZE
 
 
 def write_report(filename, html):
-    with open(filename, "w") as f:
-        f.write(html)
+    return report_store.save(filename, html)
 
 
 class WriteReportArgsSchema(BaseModel):
@@ -19,3 +25,121 @@ write_report_tool = StructuredTool.from_function(
     func=write_report,
     args_schema=WriteReportArgsSchema,
 )
+
+STYLE = (
+    "body{font-family:sans-serif;margin:2em}"
+    "table{border-collapse:collapse}"
+    "th,td{border:1px solid #ccc;padding:4px 8px;text-align:left}"
+    ".kpi{display:inline-block;border:1px solid #ccc;border-radius:8px;"
+    "padding:1em 2em;margin:0 1em 1em 0}"
+    ".kpi .value{display:block;font-size:2em;font-weight:bold}"
+)
+# Values of the first rows returned to the model with the summary
+SUMMARY_ROWS = 3
+
+
+def cell(value):
+    return html.escape("" if value is None else str(value))
+
+
+def render_table(f, columns, batches):
+    f.write("<table><thead><tr>")
+    f.write("".join(f"<th>{cell(c)}</th>" for c in columns))
+    f.write("</tr></thead><tbody>\n")
+    for rows in batches:
+        f.write(
+            "".join(
+                "<tr>" + "".join(f"<td>{cell(v)}</td>" for v in row) + "</tr>\n"
+                for row in rows
+            )
+        )
+    f.write("</tbody></table>\n")
+
+
+def render_kpi(f, columns, batches):
+    # One card per column of each row, meant for a single row of aggregates
+    for rows in batches:
+        for row in rows:
+            f.write(
+                "".join(
+                    f'<div class="kpi"><span class="label">{cell(c)}</span>'
+                    f'<span class="value">{cell(v)}</span></div>\n'
+                    for c, v in zip(columns, row)
+                )
+            )
+
+
+def render_list(f, columns, batches):
+    f.write("<ul>\n")
+    for rows in batches:
+        f.write(
+            "".join(
+                "<li>" + " - ".join(cell(v) for v in row) + "</li>\n" for row in rows
+            )
+        )
+    f.write("</ul>\n")
+
+
+TEMPLATES = {"table": render_table, "kpi": render_kpi, "list": render_list}
+
+
+def write_query_report(filename, query, template="table", title="Report"):
+    # The rows go from the cursor to the file in batches, the model only gets
+    # a summary back so the size of the report doesn't cost tokens
+    if template not in TEMPLATES:
+        return f"Unknown template '{template}', use one of: {', '.join(TEMPLATES)}"
+
+    stats = {"rows": 0, "first": []}
+
+    def batches(cursor):
+        while rows := cursor.fetchmany(FETCH_SIZE):
+            stats["rows"] += len(rows)
+            stats["first"].extend(rows[: SUMMARY_ROWS - len(stats["first"])])
+            yield rows
+
+    with pool.connection() as conn:
+        with default_budget.enforce(conn) as guard:
+            try:
+                cursor = conn.execute(query)
+                columns = [d[0] for d in cursor.description or []]
+                with report_store.open(filename) as f:
+                    f.write(
+                        f"<!DOCTYPE html><html><head><meta charset='utf-8'>"
+                        f"<title>{cell(title)}</title><style>{STYLE}</style>"
+                        f"</head><body><h1>{cell(title)}</h1>\n"
+                    )
+                    TEMPLATES[template](f, columns, batches(cursor))
+                    f.write("</body></html>\n")
+            except sqlite3.OperationalError as err:
+                if guard["exceeded"]:
+                    return default_budget.error_message(guard)
+                return f"{QUERY_ERROR}: {str(err)}"
+
+    return {
+        "filename": filename,
+        "template": template,
+        "columns": columns,
+        "rows": stats["rows"],
+        "first_rows": stats["first"],
+        "hash": f.entry["hash"],
+    }
+
+
+class WriteQueryReportArgsSchema(BaseModel):
+    filename: str
+    query: str
+    template: str = "table"
+    title: str = "Report"
+
+
+write_query_report_tool = StructuredTool.from_function(
+    name="write_query_report",
+    description=(
+        "Run a SQLite query and write its rows to an HTML report on disk. "
+        "template is 'table', 'kpi' (cards, for one row of totals) or 'list'. "
+        "Returns the number of rows and the first ones. Use it instead of "
+        "write_report when the report shows the result of a query."
+    ),
+    func=write_query_report,
+    args_schema=WriteQueryReportArgsSchema,
+)
@@ -0,0 +1,207 @@
+import argparse
+import ast
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
+
+from dotenv import load_dotenv
+from langchain.callbacks.base import BaseCallbackHandler
+from sql_agent import build_agent_executor, tools
+from tools.budget import ERROR_PREFIXES
+
+REPORT_JOBS_DIR = os.getenv("REPORT_JOBS_DIR", "report_jobs")
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", 4))
+# Tool calls worth replaying, describe_tables/fetch_next_page only help the
+# model find its way
+RECORDED_TOOLS = [
+    "run_sqlite_query",
+    "write_report",
+    "write_query_report",
+    "write_chart_report",
+]
+tools_by_name = {tool.name: tool for tool in tools}
+
+
+class ReportRecorder(BaseCallbackHandler):
+    # Keeps the tool calls of an agent run, in order, with what they returned
+    def __init__(self):
+        self.calls = []
+        self._open = {}
+
+    def on_tool_start(self, serialized, input_str, *, run_id, inputs=None, **kwargs):
+        if serialized["name"] in RECORDED_TOOLS:
+            call = {"tool": serialized["name"], "args": inputs or {}, "output": None}
+            self._open[run_id] = call
+            self.calls.append(call)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        if run_id in self._open:
+            self._open.pop(run_id)["output"] = output
+
+
+def scalar(output):
+    # The value of a one row, one column result ("[(1500,)]"), else None
+    try:
+        rows = ast.literal_eval(output)
+    except (ValueError, SyntaxError, TypeError):
+        return None
+    if isinstance(rows, list) and len(rows) == 1 and len(rows[0]) == 1:
+        return rows[0][0]
+    return None
+
+
+def parameterize(text, parameter, value, results):
+    # The recorded text becomes a string.Template: the value of the parameter
+    # turns into $table (${Table} when capitalized) and the numbers the
+    # queries returned into $q0, $q1...
+    text = text.replace("$", "$$")
+    for variable, result in results.items():
+        text = re.sub(
+            rf"(?<![\w.]){re.escape(str(result))}(?![\w.])", f"${{{variable}}}", text
+        )
+    for variant, name in (
+        (value, parameter),
+        (value.capitalize(), parameter.capitalize()),
+    ):
+        # orders_report.html counts too, _ doesn't end the word here
+        text = re.sub(
+            rf"(?<![A-Za-z0-9]){re.escape(variant)}(?![A-Za-z0-9])",
+            f"${{{name}}}",
+            text,
+        )
+    return text
+
+
+def build_job(name, calls, parameter, value):
+    steps = []
+    results = {}
+    # Queries whose result can't become a variable (rows, text)
+    unreplayable = []
+    for call in calls:
+        if call["tool"] == "write_report" and unreplayable:
+            # The model wrote that html from rows a run for another value
+            # wouldn't return, replaying it would show the recorded ones
+            raise ValueError(
+                f"write_report shows the result of '{unreplayable[-1]}', which "
+                "is not a single number, so it can't be replayed for another "
+                f"{parameter}. Ask for a write_query_report or "
+                "write_chart_report instead, they render the rows of the query."
+            )
+        args = {}
+        for key, arg in call["args"].items():
+            if isinstance(arg, str):
+                # Results only fill text, a query keeps its literals
+                known = {} if key == "query" else results
+                arg = parameterize(arg, parameter, value, known)
+            args[key] = arg
+        step = {"tool": call["tool"], "args": args}
+        if call["tool"] == "run_sqlite_query":
+            result = scalar(call["output"])
+            if result is not None and not isinstance(result, str):
+                step["result"] = f"q{len(results)}"
+                results[step["result"]] = result
+            elif not str(call["output"]).startswith(ERROR_PREFIXES):
+                unreplayable.append(call["args"].get("query"))
+        steps.append(step)
+    return {"name": name, "parameter": parameter, "example": value, "steps": steps}
+
+
+def run_job(job, value):
+    # No model involved: the recorded queries run again with the new value and
+    # their results fill the report
+    started = time.perf_counter()
+    variables = {
+        job["parameter"]: value,
+        job["parameter"].capitalize(): value.capitalize(),
+    }
+    outputs = []
+    try:
+        for step in job["steps"]:
+            args = {
+                key: (
+                    Template(arg).substitute(variables) if isinstance(arg, str) else arg
+                )
+                for key, arg in step["args"].items()
+            }
+            output = tools_by_name[step["tool"]].run(args)
+            if isinstance(output, str) and output.startswith(ERROR_PREFIXES):
+                raise RuntimeError(output)
+            if "result" in step:
+                variables[step["result"]] = output[0][0]
+            if step["tool"] != "run_sqlite_query":
+                outputs.append(args["filename"])
+    except Exception as e:
+        return {
+            "value": value,
+            "error": str(e),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+    return {
+        "value": value,
+        "reports": outputs,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def run_jobs(job, values, workers=REPORT_JOB_WORKERS):
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report") as pool:
+        return list(pool.map(lambda value: run_job(job, value), values))
+
+
+def job_path(name):
+    return os.path.join(REPORT_JOBS_DIR, f"{name}.json")
+
+
+def save_job(job):
+    os.makedirs(REPORT_JOBS_DIR, exist_ok=True)
+    with open(job_path(job["name"]), "w") as f:
+        json.dump(job, f, indent=2)
+
+
+def load_job(name):
+    with open(job_path(name)) as f:
+        return json.load(f)
+
+
+def record(name, question, parameter, value, agent_executor=None):
+    recorder = ReportRecorder()
+    agent_executor = agent_executor or build_agent_executor()
+    agent_executor.run(question, callbacks=[recorder])
+    job = build_job(name, recorder.calls, parameter, value)
+    save_job(job)
+    return job
+
+
+if __name__ == "__main__":
+    # python report_jobs.py record count "How many orders are there? Write the
+    #   result to an html report." --value orders
+    # python report_jobs.py run count users products carts
+    parser = argparse.ArgumentParser(description="Recorded report jobs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser("record", help="record an agent run")
+    record_parser.add_argument("name")
+    record_parser.add_argument("question")
+    record_parser.add_argument("--parameter", default="table")
+    record_parser.add_argument("--value", required=True, help="e.g. orders")
+    run_parser = subparsers.add_parser("run", help="run a job for many values")
+    run_parser.add_argument("name")
+    run_parser.add_argument("values", nargs="+")
+    run_parser.add_argument("--workers", type=int, default=REPORT_JOB_WORKERS)
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.command == "record":
+        try:
+            job = record(args.name, args.question, args.parameter, args.value)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        print(json.dumps(job, indent=2))
+    else:
+        started = time.perf_counter()
+        results = run_jobs(load_job(args.name), args.values, args.workers)
+        for result in results:
+            print(json.dumps(result))
+        print(f"{len(results)} reports in {time.perf_counter() - started:.2f}s")
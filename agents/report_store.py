@@ -0,0 +1,154 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Where the objects (one per distinct content) and the index are kept, the
+# reports keep the names they were written with
+REPORT_STORE_DIR = os.getenv("REPORT_STORE_DIR", ".reports")
+CHUNK_SIZE = 1 << 16
+# mkstemp creates files only the owner can read, reports get served
+FILE_MODE = 0o644
+
+
+def compress_file(source, target, compress):
+    with open(source, "rb") as f:
+        data = compress(f.read())
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.chmod(tmp, FILE_MODE)
+    os.replace(tmp, target)
+
+
+def link(source, target):
+    # The report name points to the object, replaced in one step so a reader
+    # sees the old report or the new one, never half of it
+    if os.path.exists(target) and os.path.samefile(source, target):
+        return
+    tmp = f"{target}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(source, tmp)
+    except OSError:
+        # Another file system, or links not supported
+        shutil.copyfile(source, tmp)
+    os.replace(tmp, target)
+
+
+class PendingReport:
+    def __init__(self, file):
+        self.file = file
+        self.entry = None
+
+    def write(self, text):
+        self.file.write(text)
+
+
+class ReportStore:
+    # Reports are written to a temporary file and stored once per content
+    # (sha256) in objects/, with gzip and (if installed) brotli copies made
+    # once per content too. The report name and its .gz/.br are links to the
+    # objects. index.json has hash, size and creation time of every report.
+    def __init__(self, path=REPORT_STORE_DIR):
+        self.path = path
+        self.objects = os.path.join(path, "objects")
+        self.index_path = os.path.join(path, "index.json")
+        self.compressors = {".gz": gzip.compress}
+        if brotli is not None:
+            self.compressors[".br"] = brotli.compress
+
+    @contextmanager
+    def open(self, filename):
+        os.makedirs(self.objects, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.objects, suffix=".tmp")
+        os.chmod(tmp, FILE_MODE)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                report = PendingReport(f)
+                yield report
+            report.entry = self._commit(filename, tmp)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def save(self, filename, content):
+        with self.open(filename) as report:
+            report.write(content)
+        return report.entry
+
+    def _commit(self, filename, tmp):
+        digest = hashlib.sha256()
+        with open(tmp, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        folder = os.path.join(self.objects, content_hash[:2])
+        obj = os.path.join(folder, content_hash + os.path.splitext(filename)[1])
+        os.makedirs(folder, exist_ok=True)
+        if not os.path.exists(obj):
+            os.replace(tmp, obj)
+        for suffix, compress in self.compressors.items():
+            if not os.path.exists(obj + suffix):
+                compress_file(obj, obj + suffix, compress)
+
+        link(obj, filename)
+        sizes = {"size": os.path.getsize(obj)}
+        for suffix in (".gz", ".br"):
+            if suffix in self.compressors:
+                link(obj + suffix, filename + suffix)
+                sizes[suffix[1:] + "_size"] = os.path.getsize(obj + suffix)
+            elif os.path.exists(filename + suffix):
+                # Left from a run with brotli, it would be stale
+                os.remove(filename + suffix)
+        return self._index(filename, {"hash": content_hash, **sizes})
+
+    @contextmanager
+    def _locked_index(self):
+        # Other processes write reports too, the index is read and written
+        # under a file lock
+        with open(self.index_path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                index = {}
+                if os.path.exists(self.index_path):
+                    with open(self.index_path) as f:
+                        index = json.load(f)
+                yield index
+                fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+                with os.fdopen(fd, "w") as f:
+                    json.dump(index, f, indent=2)
+                os.chmod(tmp, FILE_MODE)
+                os.replace(tmp, self.index_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _index(self, filename, entry):
+        key = os.path.relpath(filename)
+        with self._locked_index() as index:
+            previous = index.get(key)
+            if previous and previous["hash"] == entry["hash"]:
+                entry["created"] = previous["created"]
+            else:
+                entry["created"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+            index[key] = entry
+        return {"filename": filename, **entry}
+
+    def index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path) as f:
+            return json.load(f)
+
+
+report_store = ReportStore()
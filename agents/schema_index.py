@@ -0,0 +1,144 @@
+import os
+import re
+import threading
+from typing import Any, List
+
+from langchain.prompts.chat import BaseMessagePromptTemplate
+from langchain.pydantic_v1 import Field
+from langchain.schema import SystemMessage
+from token_counter import token_counter
+from tools.catalog import catalog
+
+SCHEMA_MAX_TOKENS = int(os.getenv("SCHEMA_MAX_TOKENS", 300))
+STOP_WORDS = set(
+    "the how many much what which who are is there with for and per each all "
+    "from have has that this was were write report html result results give "
+    "show list number".split()
+)
+TABLE_WEIGHT = 3
+COLUMN_WEIGHT = 1
+# A table other selected tables point to with <name>_id columns
+JOIN_WEIGHT = 1
+
+
+def stem(word):
+    if word.endswith("sses"):
+        return word[:-2]
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def keywords(text):
+    words = re.split(r"[^a-z0-9]+", text.lower())
+    return {stem(w) for w in words if len(w) > 2 and w not in STOP_WORDS}
+
+
+def column_keywords(table):
+    # user_id is about the users table, not about this one
+    words = set()
+    for column in table.columns:
+        if column.name != "id" and not column.name.endswith("_id"):
+            words |= keywords(column.name)
+    return words
+
+
+class SchemaIndex:
+    # Keywords of every table (its name and its columns) and a one line
+    # description of it, rebuilt when the schema changes. select() returns the
+    # lines of the tables a question talks about, most relevant first, within
+    # a token budget.
+    def __init__(self, catalog=catalog):
+        self.catalog = catalog
+        self.version = None
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            tables = self.catalog.refresh()
+            if self.catalog.version == self.version:
+                return self._tables
+            self._tables = {
+                name: {
+                    "name": keywords(name),
+                    "columns": column_keywords(table),
+                    "joins": {
+                        stem(c.name[:-3])
+                        for c in table.columns
+                        if c.name.endswith("_id")
+                    },
+                    "line": self.line(table),
+                }
+                for name, table in tables.items()
+            }
+            self.version = self.catalog.version
+            return self._tables
+
+    @staticmethod
+    def line(table):
+        columns = ", ".join(
+            f"{c.name} {c.type}".strip() + (" pk" if c.primary_key else "")
+            for c in table.columns
+        )
+        return f"{table.name}({columns})"
+
+    def scores(self, question):
+        words = keywords(question)
+        tables = self.refresh()
+        scores = {
+            name: TABLE_WEIGHT * len(words & t["name"])
+            + COLUMN_WEIGHT * len(words & t["columns"])
+            for name, t in tables.items()
+        }
+        for name, t in tables.items():
+            if words & t["name"]:
+                for other, o in tables.items():
+                    if other != name and t["joins"] & o["name"]:
+                        scores[other] += JOIN_WEIGHT
+        return scores
+
+    def select(self, question, max_tokens=SCHEMA_MAX_TOKENS):
+        tables = self.refresh()
+        scores = self.scores(question)
+        ranked = sorted(tables, key=lambda name: -scores[name])
+        if any(scores.values()):
+            ranked = [name for name in ranked if scores[name] > 0]
+        # Nothing matched: as many tables as fit, in catalog order
+
+        lines = [tables[name]["line"] for name in ranked]
+        selected = []
+        used = 0
+        for line, tokens in zip(lines, token_counter.count_texts(lines)):
+            if used + tokens > max_tokens:
+                continue
+            selected.append(line)
+            used += tokens
+        return selected
+
+
+schema_index = SchemaIndex()
+
+
+class RelevantSchemaMessagePromptTemplate(BaseMessagePromptTemplate):
+    # System message with the columns of the tables relevant to the question,
+    # so the model can write the query without calling describe_tables first
+    index: Any = Field(default_factory=lambda: schema_index)
+    max_tokens: int = SCHEMA_MAX_TOKENS
+    input_key: str = "input"
+
+    @property
+    def input_variables(self) -> List[str]:
+        return [self.input_key]
+
+    def format_messages(self, **kwargs):
+        lines = self.index.select(kwargs[self.input_key], self.max_tokens)
+        if not lines:
+            return []
+        return [
+            SystemMessage(
+                content="Columns of the tables that look relevant:\n" + "\n".join(lines)
+            )
+        ]
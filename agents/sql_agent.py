@@ -0,0 +1,93 @@
+import os
+
+from charts import write_chart_report_tool
+from concurrent_executor import ConcurrentAgentExecutor
+from langchain.agents import AgentExecutor, BaseMultiActionAgent
+from langchain.agents.openai_functions_multi_agent.base import (
+    OpenAIMultiFunctionsAgent,
+)
+from langchain.chat_models import ChatOpenAI
+from langchain.prompts import (
+    ChatPromptTemplate,
+    HumanMessagePromptTemplate,
+    MessagesPlaceholder,
+)
+from langchain.schema import SystemMessage
+from memory.token_budget_memory import TokenBudgetMemory
+from plan_cache import PlanCachingAgent
+from report import write_query_report_tool, write_report_tool
+from schema_index import RelevantSchemaMessagePromptTemplate
+from tools.sql import describe_tables_tool, next_page_tool, run_query_tool, tables
+
+# 1 lets the model ask for several tool calls in one step, they run at the
+# same time
+MULTI_FUNCTION_AGENT = os.getenv("MULTI_FUNCTION_AGENT") == "1"
+
+tools = [
+    run_query_tool,
+    next_page_tool,
+    describe_tables_tool,
+    write_report_tool,
+    write_query_report_tool,
+    write_chart_report_tool,
+]
+
+
+def build_prompt():
+    return ChatPromptTemplate(
+        input_variables=["input"],
+        messages=[
+            SystemMessage(
+                content=(
+                    "You are an AI that has access to a SQLite database.\n"
+                    f"The database has tables of: {tables()}\n"
+                    "Do not make any assumptions about what tables exist "
+                    "or what columns exist. The columns of the tables that look "
+                    "relevant are listed below, for any other table use the "
+                    "'describe_tables' function"
+                )
+            ),
+            # Only the tables the question talks about, within a token budget
+            RelevantSchemaMessagePromptTemplate(),
+            # chat_history match with the memory key
+            MessagesPlaceholder(variable_name="chat_history"),
+            HumanMessagePromptTemplate.from_template("{input}"),
+            # This is by convention and we need it. (Similar to memory)
+            MessagesPlaceholder(variable_name="agent_scratchpad"),
+        ],
+    )
+
+
+def build_memory():
+    # Keeps the history under a token budget so every turn costs about the same
+    return TokenBudgetMemory(
+        memory_key="chat_history", return_messages=True, max_tokens=2000
+    )
+
+
+def build_agent(chat=None, multi_function=MULTI_FUNCTION_AGENT):
+    llm = chat or ChatOpenAI()
+    if multi_function:
+        # No plan cache, it records one call per step
+        return OpenAIMultiFunctionsAgent(llm=llm, prompt=build_prompt(), tools=tools)
+    # Same as OpenAIFunctionsAgent, but repeated questions replay the tool calls
+    # of the previous answer instead of asking the model for each step
+    return PlanCachingAgent(llm=llm, prompt=build_prompt(), tools=tools)
+
+
+def build_agent_executor(agent=None, verbose=False):
+    # Every executor gets its own memory, the agent, the model and the tools
+    # (connection pool, caches) can be shared between executors
+    agent = agent or build_agent()
+    # The calls of one step of a multi function agent run concurrently
+    executor_class = (
+        ConcurrentAgentExecutor
+        if isinstance(agent, BaseMultiActionAgent)
+        else AgentExecutor
+    )
+    return executor_class(
+        agent=agent,
+        tools=tools,
+        memory=build_memory(),
+        verbose=verbose,
+    )
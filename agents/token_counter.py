@@ -0,0 +1,101 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import tiktoken
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10_000))
+DEFAULT_MODEL = "gpt-3.5-turbo"
+# OpenAI wraps every message in a few tokens, and primes the reply with 3 more
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+
+@lru_cache(maxsize=None)
+def encoding_for(model_name=DEFAULT_MODEL):
+    # Loading an encoder is slow (it reads the BPE file), do it once per model
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def message_text(message):
+    # Everything of the message that is sent to the model
+    text = message.content
+    function_call = message.additional_kwargs.get("function_call")
+    if function_call:
+        text += function_call["name"] + function_call["arguments"]
+    if getattr(message, "name", None):
+        text += message.name
+    return text
+
+
+class TokenCounter:
+    # Token counts cached by content hash and encoding. The same system prompt,
+    # history and function messages are sent on every agent iteration, so after
+    # the first time they cost a hash instead of a tokenization.
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, text, encoding):
+        digest = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        return (encoding.name, digest)
+
+    def count_texts(self, texts, model_name=DEFAULT_MODEL):
+        encoding = encoding_for(model_name)
+        keys = [self._key(text, encoding) for text in texts]
+        counts = [None] * len(texts)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._counts:
+                    self._counts.move_to_end(key)
+                    counts[i] = self._counts[key]
+        missing = [i for i, count in enumerate(counts) if count is None]
+        if missing:
+            # One call for all the misses, tiktoken encodes them in parallel
+            encoded = encoding.encode_batch([texts[i] for i in missing])
+            for i, tokens in zip(missing, encoded):
+                counts[i] = len(tokens)
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            for i in missing:
+                self._counts[keys[i]] = counts[i]
+            while len(self._counts) > self.maxsize:
+                self._counts.popitem(last=False)
+        return counts
+
+    def count_text(self, text, model_name=DEFAULT_MODEL):
+        return self.count_texts([text], model_name)[0]
+
+    def count_messages(self, messages, model_name=DEFAULT_MODEL):
+        # Per message counts, including the per message overhead
+        texts = [message_text(message) for message in messages]
+        return [
+            count + TOKENS_PER_MESSAGE for count in self.count_texts(texts, model_name)
+        ]
+
+    def count_message(self, message, model_name=DEFAULT_MODEL):
+        return self.count_messages([message], model_name)[0]
+
+    def total(self, messages, model_name=DEFAULT_MODEL):
+        # What a whole prompt costs
+        return sum(self.count_messages(messages, model_name)) + TOKENS_PER_REPLY
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._counts),
+            }
+
+
+token_counter = TokenCounter()
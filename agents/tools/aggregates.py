@@ -0,0 +1,182 @@
+import argparse
+
+from tools.db import pool
+
+# Opt-in summary tables kept up to date by triggers, so the usual aggregate
+# questions are answered by a primary key lookup instead of a full scan.
+# The comments are part of the CREATE TABLE statements, the agent reads them
+# through describe_tables.
+COUNTED_TABLES = ["users", "orders", "addresses", "order_products"]
+AGGREGATES = [
+    "agg_counts",
+    "agg_user_addresses",
+    "agg_user_orders",
+    "agg_product_sales",
+]
+
+TABLES = """
+CREATE TABLE IF NOT EXISTS agg_counts (
+    -- Precomputed counts, always up to date. name is a table name
+    -- (users, orders, addresses, order_products) for its number of rows, or
+    -- 'users_with_address' for the number of users with at least one address
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+    );
+CREATE TABLE IF NOT EXISTS agg_user_addresses (
+    -- Number of addresses of each user that has at least one
+    user_id INTEGER PRIMARY KEY,
+    address_count INTEGER NOT NULL
+    );
+CREATE TABLE IF NOT EXISTS agg_user_orders (
+    -- Number of orders of each user that has at least one
+    user_id INTEGER PRIMARY KEY,
+    order_count INTEGER NOT NULL
+    );
+CREATE TABLE IF NOT EXISTS agg_product_sales (
+    -- Per product: SUM(order_products.amount) and number of order_products rows
+    product_id INTEGER PRIMARY KEY,
+    total_amount INTEGER NOT NULL,
+    order_lines INTEGER NOT NULL
+    );
+"""
+
+POPULATE = """
+DELETE FROM agg_counts;
+DELETE FROM agg_user_addresses;
+DELETE FROM agg_user_orders;
+DELETE FROM agg_product_sales;
+{counts}
+INSERT INTO agg_user_addresses
+    SELECT user_id, COUNT(*) FROM addresses WHERE user_id IS NOT NULL
+    GROUP BY user_id;
+INSERT INTO agg_counts
+    SELECT 'users_with_address', COUNT(*) FROM agg_user_addresses;
+INSERT INTO agg_user_orders
+    SELECT user_id, COUNT(*) FROM orders WHERE user_id IS NOT NULL
+    GROUP BY user_id;
+INSERT INTO agg_product_sales
+    SELECT product_id, TOTAL(amount), COUNT(*) FROM order_products
+    WHERE product_id IS NOT NULL GROUP BY product_id;
+"""
+
+# Bodies use NEW/OLD and are reused for UPDATE (remove OLD, add NEW). The
+# keys are INTEGER PRIMARY KEY (the rowid), inserting a NULL one would get an
+# id assigned, rows without a user/product are left out.
+ADD_ADDRESS = """
+    UPDATE agg_counts SET value = value + 1 WHERE name = 'users_with_address'
+        AND NEW.user_id IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM agg_user_addresses WHERE user_id = NEW.user_id);
+    INSERT INTO agg_user_addresses (user_id, address_count)
+        SELECT NEW.user_id, 1 WHERE NEW.user_id IS NOT NULL
+        ON CONFLICT (user_id) DO UPDATE SET address_count = address_count + 1;
+"""
+REMOVE_ADDRESS = """
+    UPDATE agg_user_addresses SET address_count = address_count - 1
+        WHERE user_id = OLD.user_id AND OLD.user_id IS NOT NULL;
+    UPDATE agg_counts SET value = value - 1 WHERE name = 'users_with_address'
+        AND OLD.user_id IS NOT NULL AND (SELECT address_count FROM agg_user_addresses
+             WHERE user_id = OLD.user_id) = 0;
+    DELETE FROM agg_user_addresses WHERE user_id = OLD.user_id AND address_count = 0;
+"""
+ADD_ORDER = """
+    INSERT INTO agg_user_orders (user_id, order_count)
+        SELECT NEW.user_id, 1 WHERE NEW.user_id IS NOT NULL
+        ON CONFLICT (user_id) DO UPDATE SET order_count = order_count + 1;
+"""
+REMOVE_ORDER = """
+    UPDATE agg_user_orders SET order_count = order_count - 1
+        WHERE user_id = OLD.user_id AND OLD.user_id IS NOT NULL;
+    DELETE FROM agg_user_orders WHERE user_id = OLD.user_id AND order_count = 0;
+"""
+ADD_ORDER_PRODUCT = """
+    INSERT INTO agg_product_sales (product_id, total_amount, order_lines)
+        SELECT NEW.product_id, COALESCE(NEW.amount, 0), 1
+        WHERE NEW.product_id IS NOT NULL
+        ON CONFLICT (product_id) DO UPDATE SET
+            total_amount = total_amount + COALESCE(NEW.amount, 0),
+            order_lines = order_lines + 1;
+"""
+REMOVE_ORDER_PRODUCT = """
+    UPDATE agg_product_sales SET
+            total_amount = total_amount - COALESCE(OLD.amount, 0),
+            order_lines = order_lines - 1
+        WHERE product_id = OLD.product_id AND OLD.product_id IS NOT NULL;
+    DELETE FROM agg_product_sales
+        WHERE product_id = OLD.product_id AND order_lines = 0;
+"""
+
+# table -> (body on insert, body on delete, columns whose update matters)
+MAINTAINED = {
+    "addresses": (ADD_ADDRESS, REMOVE_ADDRESS, "user_id"),
+    "orders": (ADD_ORDER, REMOVE_ORDER, "user_id"),
+    "order_products": (ADD_ORDER_PRODUCT, REMOVE_ORDER_PRODUCT, "product_id, amount"),
+}
+
+
+def trigger(name, event, table, body):
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table}\n"
+        f"BEGIN\n{body}END;\n"
+    )
+
+
+def triggers():
+    statements = []
+    for table in COUNTED_TABLES:
+        add, remove, columns = MAINTAINED.get(table, ("", "", None))
+        count = "    UPDATE agg_counts SET value = value {} 1 WHERE name = '{}';\n"
+        statements.append(
+            trigger(
+                f"agg_{table}_insert", "INSERT", table, count.format("+", table) + add
+            )
+        )
+        statements.append(
+            trigger(
+                f"agg_{table}_delete",
+                "DELETE",
+                table,
+                count.format("-", table) + remove,
+            )
+        )
+        if columns:
+            statements.append(
+                trigger(
+                    f"agg_{table}_update",
+                    f"UPDATE OF {columns}",
+                    table,
+                    remove + add,
+                )
+            )
+    return statements
+
+
+def install(pool=pool):
+    counts = "\n".join(
+        f"INSERT INTO agg_counts SELECT '{table}', COUNT(*) FROM {table};"
+        for table in COUNTED_TABLES
+    )
+    script = TABLES + POPULATE.format(counts=counts) + "".join(triggers())
+    with pool.writer() as conn:
+        conn.executescript(f"BEGIN;\n{script}COMMIT;")
+
+
+def drop(pool=pool):
+    with pool.writer() as conn:
+        names = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE 'agg%';"
+        ).fetchall()
+        script = "".join(f"DROP TRIGGER {name};\n" for (name,) in names)
+        script += "".join(f"DROP TABLE IF EXISTS {table};\n" for table in AGGREGATES)
+        conn.executescript(f"BEGIN;\n{script}COMMIT;")
+
+
+if __name__ == "__main__":
+    # From the agents folder: python -m tools.aggregates install
+    parser = argparse.ArgumentParser()
+    parser.add_argument("action", choices=["install", "drop"])
+    args = parser.parse_args()
+
+    if args.action == "install":
+        install()
+    else:
+        drop()
@@ -0,0 +1,52 @@
+import os
+import time
+from contextlib import contextmanager
+
+QUERY_MAX_SECONDS = float(os.getenv("SQLITE_QUERY_MAX_SECONDS", 10))
+QUERY_MAX_STEPS = int(os.getenv("SQLITE_QUERY_MAX_STEPS", 100_000_000))
+# The progress handler runs every CHECK_EVERY virtual machine instructions
+CHECK_EVERY = 10_000
+# The SQL tools return these instead of rows, callers that replay tool calls
+# check for them
+QUERY_ERROR = "The following error occurred"
+BUDGET_ERROR = "The query exceeded its budget"
+ERROR_PREFIXES = (QUERY_ERROR, BUDGET_ERROR)
+
+
+class QueryBudget:
+    # 0 disables the limit
+    def __init__(self, max_seconds=QUERY_MAX_SECONDS, max_steps=QUERY_MAX_STEPS):
+        self.max_seconds = max_seconds
+        self.max_steps = max_steps
+
+    @contextmanager
+    def enforce(self, conn):
+        # Yields a dict whose "exceeded" key is set when SQLite was stopped
+        # because of the budget, the statement then fails with "interrupted"
+        state = {"exceeded": None, "steps": 0}
+        deadline = time.monotonic() + self.max_seconds
+
+        def check():
+            state["steps"] += CHECK_EVERY
+            if self.max_steps and state["steps"] > self.max_steps:
+                state["exceeded"] = f"{self.max_steps} steps"
+            elif self.max_seconds and time.monotonic() > deadline:
+                state["exceeded"] = f"{self.max_seconds} seconds"
+            # Any non zero value aborts the query
+            return 1 if state["exceeded"] else 0
+
+        conn.set_progress_handler(check, CHECK_EVERY)
+        try:
+            yield state
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def error_message(self, state):
+        return (
+            f"{BUDGET_ERROR} of {state['exceeded']} and was "
+            "cancelled. Add a join condition between the tables, filter the rows "
+            "or add a LIMIT, and try again."
+        )
+
+
+default_budget = QueryBudget()
@@ -0,0 +1,73 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", 256))
+
+# Functions whose result changes between calls, queries using them are never cached
+VOLATILE = re.compile(r"\b(random|randomblob|changes|last_insert_rowid|now)\b|current_")
+LITERALS = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+
+def normalize_sql(query):
+    # Same query written with other spacing/case gets the same key. Literals
+    # are kept as they are since 'Soap' and 'soap' are different values.
+    parts = LITERALS.split(query.strip().rstrip(";").strip())
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", parts[i]).lower()
+    return "".join(parts)
+
+
+class QueryCache:
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, query, version):
+        key = normalize_sql(query)
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[1]
+            return entry[0]
+
+    def put(self, query, version, result, elapsed):
+        key = normalize_sql(query)
+        if self.maxsize <= 0 or VOLATILE.search(key):
+            return
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (result, elapsed)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "saved_seconds": round(self.saved_seconds, 6),
+            }
+
+
+query_cache = QueryCache()
@@ -0,0 +1,112 @@
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from tools.db import pool
+
+
+@dataclass
+class Column:
+    name: str
+    type: str
+    primary_key: bool
+
+
+@dataclass
+class Index:
+    name: str
+    columns: List[str]
+    unique: bool
+
+
+@dataclass
+class Table:
+    name: str
+    sql: str
+    columns: List[Column] = field(default_factory=list)
+    indexes: List[Index] = field(default_factory=list)
+    # From sqlite_stat1 when ANALYZE was run, otherwise MAX(rowid)
+    approx_rows: Optional[int] = None
+
+
+class SchemaCatalog:
+    # In-memory copy of sqlite_master, only reloaded when the schema changes
+    def __init__(self, pool=pool):
+        self.pool = pool
+        self.version = None
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def _load(self, conn):
+        stats = {}
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1';"
+        ).fetchone()
+        if has_stats:
+            for tbl, stat in conn.execute(
+                "SELECT tbl, stat FROM sqlite_stat1 WHERE idx IS NULL;"
+            ):
+                stats[tbl] = int(stat.split()[0])
+
+        tables = {}
+        rows = conn.execute(
+            "SELECT name, sql FROM sqlite_master "
+            "WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY rowid;"
+        ).fetchall()
+        for name, sql in rows:
+            table = Table(name=name, sql=sql)
+            table.columns = [
+                Column(name=col, type=type_, primary_key=bool(pk))
+                for col, type_, pk in conn.execute(
+                    "SELECT name, type, pk FROM pragma_table_info(?) ORDER BY cid;",
+                    (name,),
+                )
+            ]
+            for index, unique in conn.execute(
+                'SELECT name, "unique" FROM pragma_index_list(?);', (name,)
+            ).fetchall():
+                columns = [
+                    col
+                    for (col,) in conn.execute(
+                        "SELECT name FROM pragma_index_info(?) ORDER BY seqno;",
+                        (index,),
+                    )
+                ]
+                table.indexes.append(Index(index, columns, bool(unique)))
+
+            table.approx_rows = stats.get(name)
+            if table.approx_rows is None:
+                try:
+                    table.approx_rows = conn.execute(
+                        f'SELECT MAX(rowid) FROM "{name}";'
+                    ).fetchone()[0]
+                except sqlite3.OperationalError:
+                    # WITHOUT ROWID tables
+                    pass
+            tables[name] = table
+        return tables
+
+    def refresh(self):
+        with self._lock, self.pool.connection() as conn:
+            version = conn.execute("PRAGMA schema_version;").fetchone()[0]
+            if version != self.version:
+                self._tables = self._load(conn)
+                self.version = version
+            return self._tables
+
+    def tables(self):
+        return self.refresh()
+
+    def table_names(self):
+        return list(self.refresh())
+
+    def get(self, name):
+        return self.refresh().get(name)
+
+    def describe(self, table_names):
+        tables = self.refresh()
+        return [tables[name].sql for name in table_names if name in tables]
+
+
+catalog = SchemaCatalog()
@@ -0,0 +1,82 @@
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FETCH_SIZE = 1000
+
+
+class ColumnBuilder:
+    # Keeps numbers in a typed array (8 bytes per value) instead of one Python
+    # object per cell. The type is decided by the values: int -> int64,
+    # float (or int with NULLs) -> float64 with NaN for NULL, anything else
+    # stays a list.
+    def __init__(self):
+        self.values = None
+        self.nulls = 0
+        self.length = 0
+
+    def _to_float(self):
+        if isinstance(self.values, array) and self.values.typecode == "q":
+            self.values = array("d", self.values)
+        elif self.values is None:
+            self.values = array("d", [math.nan] * self.length)
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def append(self, value):
+        if isinstance(self.values, list):
+            self.values.append(value)
+        elif value is None:
+            self.nulls += 1
+            if self.values is not None:
+                self._to_float()
+                self.values.append(math.nan)
+        elif isinstance(value, int):
+            if self.values is None:
+                self.values = array("q", [])
+                if self.nulls:
+                    self._to_float()
+                    self.values.extend([math.nan] * self.nulls)
+            self.values.append(value)
+        elif isinstance(value, float):
+            self._to_float()
+            self.values.append(value)
+        else:
+            # Mixed types, go back to plain Python objects
+            previous = [
+                None if isinstance(v, float) and math.isnan(v) else v
+                for v in self.values or []
+            ]
+            self.values = [None] * (self.length - len(previous)) + previous
+            self.values.append(value)
+        self.length += 1
+
+    def finish(self):
+        if self.values is None:
+            self.values = [None] * self.length
+        if np is None:
+            return self.values
+        if isinstance(self.values, array):
+            dtype = np.int64 if self.values.typecode == "q" else np.float64
+            return np.frombuffer(self.values, dtype=dtype)
+        return np.array(self.values, dtype=object)
+
+
+def fetch_columns(cursor):
+    # {column name: array} from an executed cursor, NumPy arrays when NumPy
+    # is installed, otherwise array.array (numbers) or list
+    names = [description[0] for description in cursor.description or []]
+    builders = [ColumnBuilder() for _ in names]
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        for builder, values in zip(builders, zip(*rows)):
+            builder.extend(values)
+    return {name: builder.finish() for name, builder in zip(names, builders)}
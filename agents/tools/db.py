@@ -0,0 +1,111 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_PATH = os.getenv("SQLITE_DB_PATH", "db.sqlite")
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", os.cpu_count() or 4))
+
+
+def enable_wal(path=DB_PATH):
+    # WAL lets readers run while someone else writes. The mode is stored in
+    # the database file, so it is a one-off step (python tools/db.py), not
+    # something every import does to a file that may be read-only.
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA journal_mode=WAL;").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class ConnectionPool:
+    def __init__(self, path=DB_PATH, size=POOL_SIZE):
+        self.path = os.path.abspath(path)
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._detached = set()
+        self._monitor = None
+        self._monitor_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def connect(self):
+        # Read only: the agent writes the SQL, it must not be able to change data.
+        # check_same_thread is off because a connection can be released by a
+        # different thread than the one that created it, the pool guarantees
+        # that only one task uses it at a time.
+        return sqlite3.connect(
+            f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+        )
+
+    @contextmanager
+    def connection(self):
+        # Blocks when `size` connections are already in use
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self.connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        try:
+            yield conn
+        finally:
+            if id(conn) in self._detached:
+                self._detached.discard(id(conn))
+            else:
+                self._idle.put(conn)
+            self._slots.release()
+
+    def detach(self, conn):
+        # Keep a checked out connection out of the pool, e.g. to hold an open
+        # cursor after the `with` block. The caller is in charge of closing it.
+        self._detached.add(id(conn))
+
+    @contextmanager
+    def writer(self):
+        # Writable connection for maintenance (indexes, triggers), never given
+        # to the agent. SQLite has a single writer, so they run one at a time.
+        with self._write_lock:
+            conn = sqlite3.connect(self.path)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    def version(self):
+        # Changes whenever the data changes. data_version moves when any other
+        # connection commits, mtime/size of the files also catch a database
+        # replaced on disk.
+        with self._monitor_lock:
+            if self._monitor is None:
+                self._monitor = self.connect()
+            data_version = self._monitor.execute("PRAGMA data_version;").fetchone()[0]
+
+        files = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size))
+        return (data_version, tuple(files))
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+pool = ConnectionPool()
+
+
+if __name__ == "__main__":
+    print(f"{DB_PATH}: journal_mode={enable_wal()}")
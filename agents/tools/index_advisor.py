@@ -0,0 +1,234 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tools.budget import default_budget
+from tools.cache import normalize_sql
+from tools.catalog import catalog
+from tools.db import pool
+from tools.pages import MAX_ROWS
+
+# off: do nothing, suggest: only collect suggestions, apply: also create them
+ADVISOR_MODE = os.getenv("SQLITE_INDEX_ADVISOR", "suggest")
+# Wider indexes cost too much on writes, only key columns are used then
+MAX_COVERING_COLUMNS = 4
+
+KEYWORDS = set(
+    "on where join inner left right full cross outer natural "
+    "group order limit union using having as".split()
+)
+CLAUSE_END = (
+    r"\bwhere\b|\bgroup\b|\border\b|\blimit\b|\bon\b|\bjoin\b|\bunion\b|\bhaving\b"
+)
+TABLE_REF = re.compile(rf"\b(?:from|join)\s+(.+?)(?={CLAUSE_END}|\)|;|$)", re.I | re.S)
+COLUMN_REF = re.compile(r"(?:\b(\w+)\.)?\b(\w+)\b")
+# Operators around a column: "column = ..." or "... = column" (join conditions)
+EQUALITY = (re.compile(r"\s*(==?|in\b|is\b)", re.I), re.compile(r"==?\s*$"))
+RANGE = (
+    re.compile(r"\s*([<>]=?|<>|!=|between\b|like\b)", re.I),
+    re.compile(r"([<>]=?|<>|!=)\s*$"),
+)
+PLAN_SCAN = re.compile(r"^SCAN (\w+)$|^SEARCH (\w+) USING AUTOMATIC")
+
+
+def table_aliases(query):
+    # {alias or table name: table name} for the tables in FROM/JOIN clauses
+    aliases = {}
+    tables = catalog.tables()
+    for clause in TABLE_REF.findall(query):
+        for ref in clause.split(","):
+            words = [w.strip('"`[]') for w in ref.split()]
+            if not words or words[0] not in tables:
+                continue
+            aliases[words[0]] = words[0]
+            rest = [w for w in words[1:] if w.lower() != "as"]
+            if rest and rest[0].lower() not in KEYWORDS:
+                aliases[rest[0]] = words[0]
+    return aliases
+
+
+def referenced_columns(query, table, alias, aliases, operators=None):
+    # Columns of `table` used in the query (next to one of `operators` if
+    # given), either as alias.column or as a bare column name that no other
+    # table in the query has
+    columns = {c.name for c in catalog.get(table).columns}
+    others = {
+        c.name
+        for name in set(aliases.values()) - {table}
+        for c in catalog.get(name).columns
+    }
+    found = []
+    for match in COLUMN_REF.finditer(query):
+        prefix, column = match.groups()
+        if column not in columns or column in found:
+            continue
+        if not (
+            prefix == alias
+            or prefix == table
+            or (prefix is None and column not in others)
+        ):
+            continue
+        if operators is not None:
+            after, before = operators
+            if not (
+                after.match(query, match.end())
+                or before.search(query, 0, match.start())
+            ):
+                continue
+        found.append(column)
+    return found
+
+
+class IndexAdvisor:
+    def __init__(self, mode=ADVISOR_MODE, pool=pool):
+        self.mode = mode
+        self.pool = pool
+        # (table, columns) -> suggestion dict
+        self.suggestions = {}
+        # normalized query -> analyze() result, each query is explained once
+        self._analyzed = {}
+        self._lock = threading.Lock()
+        # CREATE INDEX waits for the open readers (e.g. a paged result without
+        # WAL), so it never runs inside the tool call, one at a time
+        self._applier = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="index-advisor"
+        )
+
+    def analyze(self, query):
+        with self.pool.connection() as conn:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+
+        aliases = table_aliases(query)
+        found = []
+        for _, _, _, detail in plan:
+            match = PLAN_SCAN.match(detail)
+            if not match:
+                continue
+            alias = match.group(1) or match.group(2)
+            table = aliases.get(alias)
+            if table is None:
+                continue
+            keys = referenced_columns(query, table, alias, aliases, EQUALITY)
+            keys += [
+                c
+                for c in referenced_columns(query, table, alias, aliases, RANGE)
+                if c not in keys
+            ]
+            keys = [c for c in keys if not self._is_rowid(table, c)]
+            if not keys:
+                # Plain full scan (COUNT(*), no filter), an index does not help
+                continue
+            extra = [
+                c
+                for c in referenced_columns(query, table, alias, aliases)
+                if c not in keys and not self._is_rowid(table, c)
+            ]
+            columns = keys + extra
+            if len(columns) > MAX_COVERING_COLUMNS:
+                columns = keys
+            found.append((table, tuple(columns)))
+        return found
+
+    def _is_rowid(self, table, column):
+        return any(
+            c.primary_key and c.name == column and c.type.upper() == "INTEGER"
+            for c in catalog.get(table).columns
+        )
+
+    def _already_indexed(self, table, columns):
+        return any(
+            tuple(index.columns[: len(columns)]) == columns
+            for index in catalog.get(table).indexes
+        )
+
+    def observe(self, query, elapsed):
+        # Called by run_sqlite_query with the time the query took
+        if self.mode == "off":
+            return []
+        key = normalize_sql(query)
+        found = self._analyzed.get(key)
+        first_time = found is None
+        if first_time:
+            try:
+                found = self.analyze(query)
+            except sqlite3.Error:
+                found = []
+            self._analyzed[key] = found
+
+        new = []
+        with self._lock:
+            for table, columns in found:
+                if self._already_indexed(table, columns):
+                    continue
+                suggestion = self.suggestions.get((table, columns))
+                if suggestion is None:
+                    name = "idx_" + "_".join((table,) + columns)
+                    suggestion = self.suggestions[(table, columns)] = {
+                        "table": table,
+                        "columns": list(columns),
+                        "statement": (
+                            f'CREATE INDEX IF NOT EXISTS "{name}" '
+                            f'ON "{table}" ({", ".join(columns)});'
+                        ),
+                        "hits": 0,
+                        "seconds": 0.0,
+                        "query": query,
+                        "applied": False,
+                    }
+                    new.append(suggestion)
+                suggestion["hits"] += 1
+                suggestion["seconds"] += elapsed
+
+        if self.mode == "apply" and first_time:
+            for suggestion in new:
+                self._applier.submit(self.apply, suggestion)
+        return new
+
+    def apply(self, suggestion):
+        query = suggestion["query"]
+        before = self._time(query)
+        try:
+            with self.pool.writer() as conn:
+                conn.execute(suggestion["statement"])
+        except sqlite3.Error as err:
+            # Locked by a reader or a read-only file, it stays a suggestion
+            with self._lock:
+                suggestion["error"] = str(err)
+            return suggestion
+        after = self._time(query)
+        with self._lock:
+            suggestion.pop("error", None)
+            suggestion["applied"] = True
+            suggestion["before_seconds"] = before
+            suggestion["after_seconds"] = after
+        return suggestion
+
+    def _time(self, query, budget=default_budget):
+        # Both sides measured like run_sqlite_query does: execute and the
+        # first page, under the query budget (None when it was exceeded)
+        with self.pool.connection() as conn:
+            with budget.enforce(conn):
+                start = time.perf_counter()
+                try:
+                    cursor = conn.execute(query)
+                    cursor.fetchmany(MAX_ROWS)
+                except sqlite3.OperationalError:
+                    return None
+                elapsed = time.perf_counter() - start
+                cursor.close()
+                return elapsed
+
+    def report(self):
+        # Hot spots first: the ones that cost the most time in this session
+        with self._lock:
+            return sorted(
+                (dict(s) for s in self.suggestions.values()),
+                key=lambda s: s["seconds"],
+                reverse=True,
+            )
+
+
+index_advisor = IndexAdvisor()
@@ -0,0 +1,128 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+
+MAX_ROWS = int(os.getenv("SQLITE_MAX_ROWS", 100))
+MAX_TOKENS = int(os.getenv("SQLITE_MAX_RESULT_TOKENS", 1000))
+MAX_OPEN_RESULTS = int(os.getenv("SQLITE_MAX_OPEN_RESULTS", 8))
+# An open cursor keeps a read lock (without WAL it blocks every writer), a
+# result not fetched for this long is closed
+RESULT_IDLE_SECONDS = float(os.getenv("SQLITE_RESULT_IDLE_SECONDS", 60))
+FETCH_SIZE = 50
+
+
+def estimate_tokens(row):
+    # Rough estimate (~4 characters per token) of what the row costs once it
+    # is serialized into the FunctionMessage
+    return len(str(row)) // 4 + 1
+
+
+class ResultStream:
+    def __init__(self, conn, cursor, budget=None):
+        self.conn = conn
+        self.cursor = cursor
+        self.budget = budget
+        self.done = False
+        self.closed = False
+        # Set once the connection was detached from the pool for this stream
+        self.owns_connection = False
+        self._buffer = deque()
+        self._lock = threading.RLock()
+
+    def _fill(self):
+        if not self._buffer and not self.done:
+            self._buffer.extend(self.cursor.fetchmany(FETCH_SIZE))
+            if not self._buffer:
+                # The connection is closed by close(), the caller may still
+                # have the budget handler set on it
+                self.done = True
+                self.cursor.close()
+
+    def next_page(self, max_rows=MAX_ROWS, max_tokens=MAX_TOKENS):
+        # Always returns at least one row (if there is any) so a very wide
+        # row can't block the stream
+        with self._lock:
+            rows, tokens = [], 0
+            while len(rows) < max_rows:
+                self._fill()
+                if self.done:
+                    break
+                cost = estimate_tokens(self._buffer[0])
+                if rows and tokens + cost > max_tokens:
+                    break
+                rows.append(self._buffer.popleft())
+                tokens += cost
+            # Look ahead so the last page is not reported as "more rows"
+            self._fill()
+            return rows
+
+    def close(self):
+        with self._lock:
+            if not self.closed:
+                self.closed = True
+                self.done = True
+                self.cursor.close()
+                if self.owns_connection:
+                    self.conn.close()
+
+
+class OpenResults:
+    # Streams waiting for a "next page" call. Each one keeps a connection
+    # open, so only the most recent `size` are kept, and a background thread
+    # closes the ones idle for more than `idle_seconds`.
+    def __init__(self, size=MAX_OPEN_RESULTS, idle_seconds=RESULT_IDLE_SECONDS):
+        self.size = size
+        self.idle_seconds = idle_seconds
+        # handle -> (stream, last use)
+        self._streams = OrderedDict()
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def add(self, stream):
+        handle = secrets.token_hex(4)
+        with self._lock:
+            self._streams[handle] = (stream, time.monotonic())
+            while len(self._streams) > self.size:
+                _, (oldest, _) = self._streams.popitem(last=False)
+                oldest.close()
+            if self._reaper is None and self.idle_seconds:
+                self._reaper = threading.Thread(target=self._reap, daemon=True)
+                self._reaper.start()
+        return handle
+
+    def get(self, handle):
+        with self._lock:
+            entry = self._streams.get(handle)
+            if entry is None:
+                return None
+            self._streams[handle] = (entry[0], time.monotonic())
+            return entry[0]
+
+    def discard(self, handle):
+        with self._lock:
+            self._streams.pop(handle, None)
+
+    def expire(self):
+        # Checked and removed under the lock, a stream just returned by get()
+        # is never closed here
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                handle
+                for handle, (_, used) in self._streams.items()
+                if now - used > self.idle_seconds
+            ]
+            streams = [self._streams.pop(handle)[0] for handle in expired]
+        for stream in streams:
+            stream.close()
+        return len(streams)
+
+    def _reap(self):
+        while True:
+            time.sleep(min(self.idle_seconds / 2, 5))
+            self.expire()
+
+
+open_results = OpenResults()
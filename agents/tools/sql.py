@@ -1,47 +1,173 @@
+import asyncio
 import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import List
 
 from langchain.tools import Tool
 from pydantic.v1 import BaseModel
+from tools.budget import QUERY_ERROR, default_budget
+from tools.cache import query_cache
+from tools.catalog import catalog
+from tools.columnar import fetch_columns
+from tools.db import pool
+from tools.index_advisor import index_advisor
+from tools.pages import ResultStream, open_results
 
-conn = sqlite3.connect("db.sqlite")
+# Runs the database calls of the async tools. It has as many threads as the
+# pool has connections, so a task never waits for a connection in a thread.
+executor = ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="sqlite")
 
 
-def tables():
-    c = conn.cursor()
-    c.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    rows = c.fetchall()
-    return "\n".join([row[0] for row in rows])
+async def in_executor(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
 
 
-def run_sqlite_query(query):
-    c = conn.cursor()
-    try:
-        c.execute(query)
-        return c.fetchall()
-    except sqlite3.OperationalError as err:
-        return f"The following error occured: {str(err)}"
+def tables():
+    return "\n".join(catalog.table_names())
+
+
+def page_result(rows, handle):
+    if handle is None:
+        return {"rows": rows, "next_page": None}
+    return {
+        "rows": rows,
+        "next_page": handle,
+        "note": (
+            "There are more rows. Call 'fetch_next_page' with the next_page "
+            "handle to get them, or add a LIMIT/aggregate to the query."
+        ),
+    }
+
+
+def run_sqlite_query(query, budget=default_budget):
+    version = pool.version()
+    rows = query_cache.get(query, version)
+    if rows is not None:
+        return rows
+
+    with pool.connection() as conn:
+        c = conn.cursor()
+        with budget.enforce(conn) as guard:
+            try:
+                start = time.perf_counter()
+                c.execute(query)
+                stream = ResultStream(conn, c, budget)
+                rows = stream.next_page()
+            except sqlite3.OperationalError as err:
+                if guard["exceeded"]:
+                    return budget.error_message(guard)
+                return f"{QUERY_ERROR}: {str(err)}"
+        elapsed = time.perf_counter() - start
+
+        if stream.done:
+            # Only complete results are cached, pages depend on an open cursor
+            query_cache.put(query, version, rows, elapsed)
+        else:
+            # The cursor stays open for the next pages, so the connection can't
+            # go back to the pool
+            pool.detach(conn)
+            stream.owns_connection = True
+
+    index_advisor.observe(query, elapsed)
+    if stream.done:
+        return rows
+    return page_result(rows, open_results.add(stream))
+
+
+async def arun_sqlite_query(query, budget=default_budget):
+    return await in_executor(run_sqlite_query, query, budget=budget)
+
+
+def run_sqlite_query_columnar(query, budget=default_budget):
+    # For code (reports, charts, statistics), not for the model: returns
+    # {column: array} with the whole result instead of a page of tuples
+    with pool.connection() as conn:
+        with budget.enforce(conn) as guard:
+            try:
+                return fetch_columns(conn.execute(query))
+            except sqlite3.OperationalError as err:
+                if guard["exceeded"]:
+                    return budget.error_message(guard)
+                return f"{QUERY_ERROR}: {str(err)}"
 
 
 class RunQueryArgsSchema(BaseModel):
     query: str
 
 
-run_query_tool = Tool.from_function(
-    name="run_sqlite_query",
-    description="Run a SQLite query.",
-    func=run_sqlite_query,
-    args_schema=RunQueryArgsSchema,
+def build_run_query_tool(budget=default_budget):
+    # Each tool instance can have its own time/steps budget per query
+    return Tool.from_function(
+        name="run_sqlite_query",
+        description="Run a SQLite query.",
+        func=partial(run_sqlite_query, budget=budget),
+        coroutine=partial(arun_sqlite_query, budget=budget),
+        args_schema=RunQueryArgsSchema,
+    )
+
+
+run_query_tool = build_run_query_tool()
+
+
+def fetch_next_page(handle):
+    stream = open_results.get(handle)
+    if stream is None:
+        return (
+            f"The result '{handle}' does not exist or has expired, "
+            "run the query again."
+        )
+    # The budget of the query that opened the result applies to every page
+    error = None
+    with stream.budget.enforce(stream.conn) as guard:
+        try:
+            rows = stream.next_page()
+        except sqlite3.OperationalError as err:
+            error = err
+
+    # Closed out of the budget block, the handler is reset on the connection
+    # before the stream closes it
+    if error is not None:
+        open_results.discard(handle)
+        stream.close()
+        if guard["exceeded"]:
+            return stream.budget.error_message(guard)
+        return f"{QUERY_ERROR}: {str(error)}"
+    if stream.done:
+        open_results.discard(handle)
+        stream.close()
+        return page_result(rows, None)
+    return page_result(rows, handle)
+
+
+async def afetch_next_page(handle):
+    return await in_executor(fetch_next_page, handle)
+
+
+class FetchNextPageArgsSchema(BaseModel):
+    handle: str
+
+
+next_page_tool = Tool.from_function(
+    name="fetch_next_page",
+    description=(
+        "Get the next rows of a 'run_sqlite_query' result "
+        "that was too large to return at once."
+    ),
+    func=fetch_next_page,
+    coroutine=afetch_next_page,
+    args_schema=FetchNextPageArgsSchema,
 )
 
 
 def describe_tables(table_names):
-    c = conn.cursor()
-    tables = ", ".join(["'" + table + "'" for table in table_names])
-    rows = c.execute(
-        f"SELECT sql FROM sqlite_master WHERE type='table' AND name IN ({tables});"
-    )
-    return "\n".join([row[0] for row in rows if row[0] is not None])
+    return "\n".join(catalog.describe(table_names))
+
+
+async def adescribe_tables(table_names):
+    return await in_executor(describe_tables, table_names)
 
 
 class DescribeTablesArgsSchema(BaseModel):
@@ -52,5 +178,6 @@ describe_tables_tool = Tool.from_function(
     name="describe_tables",
     description="Given a list of table names, returns the schema of those tables.",
     func=describe_tables,
+    coroutine=adescribe_tables,
     args_schema=DescribeTablesArgsSchema,
 )
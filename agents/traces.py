@@ -0,0 +1,105 @@
+import argparse
+
+from handlers.tracing_handler import TRACE_DB_PATH, TraceStore
+
+
+def print_table(headers, rows):
+    widths = [
+        max(len(str(value)) for value in [header, *[row[i] for row in rows]])
+        for i, header in enumerate(headers)
+    ]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(value).ljust(w) for value, w in zip(row, widths)))
+
+
+def fmt(value):
+    return "-" if value is None else round(value, 1)
+
+
+def steps(store, trace_id=None):
+    # Latency breakdown of one question: every span of the trace as a tree
+    if trace_id is None:
+        last = store.query(
+            "SELECT trace_id FROM spans WHERE parent_id IS NULL "
+            "ORDER BY started DESC LIMIT 1;"
+        )
+        if not last:
+            print("No traces yet")
+            return
+        trace_id = last[0][0]
+
+    spans = store.query(
+        "SELECT span_id, parent_id, kind, name, duration_ms, total_tokens, error, "
+        "question FROM spans WHERE trace_id = ? ORDER BY started;",
+        (trace_id,),
+    )
+    ids = {span[0] for span in spans}
+    children = {}
+    for span in spans:
+        children.setdefault(span[1] if span[1] in ids else None, []).append(span)
+
+    rows = []
+
+    def walk(span, depth):
+        span_id, _, kind, name, duration, tokens, error, _ = span
+        label = "  " * depth + name + (" (error)" if error else "")
+        rows.append((label, kind, fmt(duration), tokens or ""))
+        for child in children.get(span_id, []):
+            walk(child, depth + 1)
+
+    roots = children.get(None, [])
+    print(f"Trace {trace_id}: {roots[0][7] if roots else ''}\n")
+    for root in roots:
+        walk(root, 0)
+    print_table(["span", "kind", "ms", "tokens"], rows)
+
+
+def tools(store, limit):
+    rows = store.query(
+        "SELECT name, COUNT(*), AVG(duration_ms), MAX(duration_ms), "
+        "SUM(error IS NOT NULL) FROM spans WHERE kind = 'tool' "
+        "GROUP BY name ORDER BY AVG(duration_ms) DESC LIMIT ?;",
+        (limit,),
+    )
+    print_table(
+        ["tool", "calls", "avg ms", "max ms", "errors"],
+        [(name, n, fmt(avg), fmt(max_), errors) for name, n, avg, max_, errors in rows],
+    )
+
+
+def questions(store, limit):
+    rows = store.query(
+        "SELECT root.question, root.duration_ms, "
+        "(SELECT COUNT(*) FROM spans s WHERE s.trace_id = root.trace_id "
+        " AND s.kind = 'llm'), "
+        "(SELECT SUM(total_tokens) FROM spans s WHERE s.trace_id = root.trace_id) "
+        "FROM spans root WHERE root.parent_id IS NULL "
+        "ORDER BY root.started DESC LIMIT ?;",
+        (limit,),
+    )
+    print_table(
+        ["question", "ms", "llm calls", "tokens"],
+        [(q or "-", fmt(ms), calls, tokens or 0) for q, ms, calls, tokens in rows],
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show traces of TracingHandler")
+    parser.add_argument("--db", default=TRACE_DB_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    steps_parser = subparsers.add_parser("steps", help="latency per step of a trace")
+    steps_parser.add_argument("trace_id", nargs="?", help="default: the last one")
+    tools_parser = subparsers.add_parser("tools", help="slowest tools")
+    tools_parser.add_argument("--limit", type=int, default=10)
+    questions_parser = subparsers.add_parser("questions", help="tokens per question")
+    questions_parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    store = TraceStore(args.db)
+    if args.command == "steps":
+        steps(store, args.trace_id)
+    elif args.command == "tools":
+        tools(store, args.limit)
+    else:
+        questions(store, args.limit)
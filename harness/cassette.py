@@ -0,0 +1,207 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+
+import openai
+from openai.util import convert_to_openai_object
+
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassette.jsonl")
+# record: always call the API and save, replay: never call it, auto: replay
+# what is in the cassette and record the rest
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "auto")
+# "recorded" sleeps as long as the real call took, a number sleeps that many
+# seconds, 0 answers right away
+CASSETTE_LATENCY = os.getenv("CASSETTE_LATENCY", "recorded")
+
+# Not part of what was asked, they change between machines and runs
+IGNORED = {
+    "api_key",
+    "api_base",
+    "api_type",
+    "api_version",
+    "organization",
+    "request_id",
+    "request_timeout",
+    "headers",
+}
+
+
+class CassetteMiss(Exception):
+    pass
+
+
+def request_key(endpoint, kwargs):
+    request = {k: v for k, v in kwargs.items() if k not in IGNORED}
+    data = json.dumps([endpoint, request], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def to_dict(response):
+    if isinstance(response, dict):
+        return json.loads(json.dumps(response))
+    # Streamed answer, every chunk is kept
+    return [json.loads(json.dumps(chunk)) for chunk in response]
+
+
+class Cassette:
+    # Request/response pairs of the OpenAI API in a JSONL file, one line per
+    # call. The same request asked several times gets its answers back in the
+    # order they were recorded.
+    def __init__(
+        self, path=CASSETTE_PATH, mode=CASSETTE_MODE, latency=CASSETTE_LATENCY
+    ):
+        if mode not in ("record", "replay", "auto"):
+            raise ValueError(f"Unknown cassette mode {mode}")
+        # Absolute, harness.run changes the folder before the script runs
+        self.path = os.path.abspath(path)
+        self.mode = mode
+        self.latency = latency
+        self.hits = 0
+        self.misses = 0
+        self.simulated = 0.0
+        self._entries = {}
+        self._played = {}
+        self._lock = threading.Lock()
+        if mode != "record" and os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["key"], []).append(entry)
+        elif mode == "record" and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def find(self, key):
+        if self.mode == "record":
+            return None
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            played = self._played.get(key, 0)
+            self._played[key] = played + 1
+            return entries[played % len(entries)]
+
+    def delay(self, entry):
+        if self.latency == "recorded":
+            return entry["latency"]
+        return float(self.latency)
+
+    def save(self, key, endpoint, kwargs, response, latency):
+        entry = {
+            "key": key,
+            "endpoint": endpoint,
+            "request": {k: v for k, v in kwargs.items() if k not in IGNORED},
+            "response": to_dict(response),
+            "latency": round(latency, 3),
+        }
+        with self._lock:
+            self._entries.setdefault(key, []).append(entry)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+        return entry
+
+    def answer(self, entry):
+        if isinstance(entry["response"], list):
+            return (convert_to_openai_object(chunk) for chunk in entry["response"])
+        return convert_to_openai_object(entry["response"])
+
+    def _lookup(self, endpoint, kwargs):
+        key = request_key(endpoint, kwargs)
+        entry = self.find(key)
+        with self._lock:
+            if entry is not None:
+                self.hits += 1
+                self.simulated += self.delay(entry)
+            else:
+                self.misses += 1
+        if entry is None and self.mode == "replay":
+            raise CassetteMiss(f"{endpoint} request not in {self.path} ({key[:12]})")
+        return key, entry
+
+    def call(self, endpoint, create, **kwargs):
+        key, entry = self._lookup(endpoint, kwargs)
+        if entry is None:
+            started = time.monotonic()
+            response = create(**kwargs)
+            entry = self.save(
+                key, endpoint, kwargs, response, time.monotonic() - started
+            )
+        else:
+            time.sleep(self.delay(entry))
+        return self.answer(entry)
+
+    async def acall(self, endpoint, acreate, **kwargs):
+        key, entry = self._lookup(endpoint, kwargs)
+        if entry is None:
+            started = time.monotonic()
+            response = await acreate(**kwargs)
+            if not isinstance(response, dict):
+                response = [chunk async for chunk in response]
+            entry = self.save(
+                key, endpoint, kwargs, response, time.monotonic() - started
+            )
+        else:
+            await asyncio.sleep(self.delay(entry))
+        answer = self.answer(entry)
+        if isinstance(answer, dict):
+            return answer
+        return self._aiter(answer)
+
+    @staticmethod
+    async def _aiter(chunks):
+        for chunk in chunks:
+            yield chunk
+
+    def report(self):
+        return {
+            "cassette": self.path,
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "simulated_seconds": round(self.simulated, 2),
+        }
+
+
+ENDPOINTS = {
+    "chat": openai.ChatCompletion,
+    "completion": openai.Completion,
+    "embedding": openai.Embedding,
+}
+originals = {}
+
+
+def install(cassette=None):
+    # Wraps openai.ChatCompletion/Completion/Embedding like the rate limiter,
+    # install the cassette last so replayed calls skip the limiter
+    cassette = cassette or Cassette()
+    uninstall()
+    for endpoint, api in ENDPOINTS.items():
+        originals[api] = (api.__dict__["create"], api.__dict__["acreate"])
+        create, acreate = api.create, api.acreate
+
+        @functools.wraps(create)
+        def recorded_create(*args, _endpoint=endpoint, _create=create, **kwargs):
+            return cassette.call(_endpoint, functools.partial(_create, *args), **kwargs)
+
+        @functools.wraps(acreate)
+        async def recorded_acreate(
+            *args, _endpoint=endpoint, _acreate=acreate, **kwargs
+        ):
+            return await cassette.acall(
+                _endpoint, functools.partial(_acreate, *args), **kwargs
+            )
+
+        api.create = staticmethod(recorded_create)
+        api.acreate = staticmethod(recorded_acreate)
+    return cassette
+
+
+def uninstall():
+    for api, (create, acreate) in originals.items():
+        api.create = create
+        api.acreate = acreate
+    originals.clear()
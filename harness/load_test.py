@@ -0,0 +1,67 @@
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+from harness.mock_server import serve
+from harness.rate_limiter import AdaptiveRateLimiter, install, uninstall
+
+
+def ask(index, blind_retries):
+    # Without the limiter failed requests are retried right away, like the
+    # scripts did before
+    for attempt in range(blind_retries + 1):
+        try:
+            openai.ChatCompletion.create(
+                model="gpt-3.5-turbo",
+                messages=[{"role": "user", "content": f"Question number {index}"}],
+            )
+            return True
+        except openai.error.RateLimitError:
+            if attempt == blind_retries:
+                return False
+
+
+def blast(requests, threads, limiter=None, blind_retries=2):
+    if limiter:
+        install(limiter)
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda i: ask(i, blind_retries), range(requests)))
+    elapsed = time.monotonic() - started
+    uninstall()
+    return {
+        "answered": sum(results),
+        "failed": len(results) - sum(results),
+        "seconds": round(elapsed, 2),
+        "requests_per_minute": round(sum(results) / elapsed * 60, 1),
+    }
+
+
+if __name__ == "__main__":
+    # Sends the same burst of chat requests to a local mock endpoint with and
+    # without the rate limiter, the quota of the mock is the target throughput
+    parser = argparse.ArgumentParser(description="Rate limiter load test")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=60000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    openai.api_key = "mock"
+    for name in ("without limiter", "with limiter"):
+        server = serve(rpm=args.rpm, tpm=args.tpm, latency=args.latency)
+        openai.api_base = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        limiter = None
+        if name == "with limiter":
+            limiter = AdaptiveRateLimiter(
+                rpm=args.rpm, tpm=args.tpm, max_concurrency=args.threads
+            )
+        result = blast(args.requests, args.threads, limiter)
+        result["server"] = server.stats
+        if limiter:
+            result["limiter"] = limiter.report()
+        print(name, json.dumps(result, indent=2))
+        server.shutdown()
@@ -0,0 +1,165 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_SIZE = 1536
+
+
+def count_tokens(value):
+    return len(json.dumps(value)) // 4 + 1
+
+
+def embedding(text):
+    # Same text, same vector
+    seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+    rng = random.Random(seed)
+    return [rng.uniform(-1, 1) for _ in range(EMBEDDING_SIZE)]
+
+
+class Quota:
+    # Requests and tokens of the last `window` seconds, the provider checks its
+    # per-minute limits over short windows too
+    def __init__(self, rpm, tpm, window=10):
+        self.window_seconds = window
+        self.requests = rpm * window / 60
+        self.max_tokens = tpm * window / 60
+        self.window = deque()
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def admit(self, tokens):
+        # Returns None when the request fits, otherwise seconds to wait
+        with self._lock:
+            now = time.monotonic()
+            while self.window and now - self.window[0][0] >= self.window_seconds:
+                self.tokens -= self.window.popleft()[1]
+            full = len(self.window) >= self.requests
+            if not full and self.tokens + tokens <= self.max_tokens:
+                self.window.append((now, tokens))
+                self.tokens += tokens
+                return None
+            if not self.window:
+                return float(self.window_seconds)
+            return round(self.window_seconds - (now - self.window[0][0]), 3)
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def count(self, key):
+        with self.server.lock:
+            self.server.stats[key] += 1
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        endpoint = self.path.rstrip("/").rsplit("/", 1)[-1]
+        prompt = request.get("messages") or request.get("prompt") or request["input"]
+        prompt_tokens = count_tokens(prompt)
+        completion_tokens = 0 if endpoint == "embeddings" else server.answer_tokens
+        self.count("requests")
+
+        wait = server.quota.admit(prompt_tokens + completion_tokens)
+        if wait is not None:
+            self.count("rate_limited")
+            self.send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                {"Retry-After": str(wait)},
+            )
+            return
+
+        # Slower when busy, like a real endpoint under load
+        with server.lock:
+            server.in_flight += 1
+            busy = server.in_flight
+        time.sleep(server.latency * (1 + busy / server.capacity))
+        with server.lock:
+            server.in_flight -= 1
+
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        body = {"id": "mock", "created": int(time.time()), "model": "mock"}
+        answer = "word " * server.answer_tokens
+        if endpoint == "embeddings":
+            texts = prompt if isinstance(prompt, list) else [prompt]
+            body["object"] = "list"
+            body["data"] = [
+                {"object": "embedding", "index": i, "embedding": embedding(str(t))}
+                for i, t in enumerate(texts)
+            ]
+            usage.pop("completion_tokens")
+        elif endpoint == "completions" and "messages" in request:
+            body["object"] = "chat.completion"
+            body["choices"] = [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": answer.strip()},
+                    "finish_reason": "stop",
+                }
+            ]
+        else:
+            body["object"] = "text_completion"
+            body["choices"] = [
+                {"index": 0, "text": answer, "logprobs": None, "finish_reason": "stop"}
+            ]
+        body["usage"] = usage
+        self.count("answered")
+        self.send_json(200, body)
+
+
+def serve(
+    port=0, rpm=600, tpm=60000, latency=0.2, window=10, capacity=16, answer_tokens=20
+):
+    # Local stand-in for the OpenAI API with its own quota. Point the client
+    # at it with OPENAI_API_BASE=http://127.0.0.1:<port>/v1 (any API key)
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockOpenAIHandler)
+    server.daemon_threads = True
+    server.quota = Quota(rpm, tpm, window)
+    server.latency = latency
+    server.capacity = capacity
+    server.answer_tokens = answer_tokens
+    server.in_flight = 0
+    server.lock = threading.Lock()
+    server.stats = {"requests": 0, "answered": 0, "rate_limited": 0}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI endpoint")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=60000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.rpm, args.tpm, args.latency)
+    print(f"Listening on http://127.0.0.1:{args.port}/v1")
+    try:
+        while True:
+            time.sleep(10)
+            print(server.stats)
+    except KeyboardInterrupt:
+        server.shutdown()
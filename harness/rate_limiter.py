@@ -0,0 +1,309 @@
+import asyncio
+import functools
+import json
+import os
+import random
+import threading
+import time
+
+import openai
+
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", 3500))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", 90000))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 16))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 6))
+# The quota is per minute but the provider also rejects short bursts
+OPENAI_BURST_SECONDS = float(os.getenv("OPENAI_BURST_SECONDS", 5))
+# Tokens reserved for the answer of the first requests without max_tokens,
+# then the average of the answers seen so far
+COMPLETION_TOKENS_GUESS = 256
+
+RETRYABLE = (
+    openai.error.RateLimitError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.ServiceUnavailableError,
+    openai.error.TryAgain,
+)
+
+
+def estimate_tokens(kwargs, completion_tokens=COMPLETION_TOKENS_GUESS):
+    # About 4 characters per token for the prompt, plus the answer
+    prompt = kwargs.get("messages") or kwargs.get("prompt") or kwargs.get("input")
+    tokens = len(json.dumps(prompt, default=str)) // 4 + 1
+    if "input" in kwargs:
+        return tokens
+    return tokens + (kwargs.get("max_tokens") or completion_tokens)
+
+
+def is_retryable(error):
+    if isinstance(error, RETRYABLE):
+        return True
+    status = getattr(error, "http_status", None)
+    return isinstance(error, openai.error.APIError) and (status or 500) >= 500
+
+
+def retry_after(error):
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    # `rate` units per minute, bursts up to `burst` seconds worth of it
+    def __init__(self, rate, burst=OPENAI_BURST_SECONDS):
+        self.rate = rate / 60
+        self.capacity = self.rate * burst
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, amount):
+        # Takes `amount` and returns 0, or returns how long to wait before
+        # trying again. More than the capacity is allowed once the bucket is
+        # full, the level goes negative and the next callers wait for it.
+        with self._lock:
+            self._refill()
+            needed = min(amount, self.capacity)
+            if self.level >= needed:
+                self.level -= amount
+                return 0.0
+            return (needed - self.level) / self.rate
+
+    def give_back(self, amount):
+        # Corrects a reservation once the real usage is known (negative
+        # amounts charge more)
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+    def drain(self, seconds):
+        # After a 429 nothing else should go out for `seconds`
+        with self._lock:
+            self._refill()
+            self.level = min(self.level, -seconds * self.rate)
+
+
+class AdaptiveRateLimiter:
+    # Client-side scheduler for every OpenAI request of the process:
+    # - token buckets keep requests/min and tokens/min under the quota
+    # - the number of requests in flight grows by one per window of successes
+    #   and is cut in half on a 429 or when latency jumps (AIMD), so the
+    #   client settles close to what the provider accepts
+    # - failed requests are retried with exponential backoff and full jitter
+    def __init__(
+        self,
+        rpm=OPENAI_RPM,
+        tpm=OPENAI_TPM,
+        max_concurrency=OPENAI_MAX_CONCURRENCY,
+        max_retries=OPENAI_MAX_RETRIES,
+        base_delay=0.5,
+        max_delay=30.0,
+        latency_spike=3.0,
+    ):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.latency_spike = latency_spike
+        self.limit = float(max(1, max_concurrency // 4))
+        self.in_flight = 0
+        self.latency = None
+        self.last_decrease = 0.0
+        self.completion_tokens = COMPLETION_TOKENS_GUESS
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "errors": 0,
+            "tokens": 0,
+            "waited": 0.0,
+        }
+        self._condition = threading.Condition()
+
+    # Concurrency window
+
+    def _try_enter(self):
+        with self._condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def _enter(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def _leave(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _decrease(self):
+        # At most once per observed latency, a burst of 429s from requests
+        # that were already in flight counts as one signal
+        now = time.monotonic()
+        with self._condition:
+            if now - self.last_decrease < (self.latency or 1.0):
+                return
+            self.last_decrease = now
+            self.limit = max(1.0, self.limit / 2)
+
+    def _succeeded(self, elapsed):
+        with self._condition:
+            spike = self.latency and elapsed > self.latency * self.latency_spike
+            self.latency = (
+                elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+            )
+            if not spike:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+        if spike:
+            self._decrease()
+
+    def _failed(self, error):
+        if isinstance(error, openai.error.RateLimitError):
+            self._count("rate_limited")
+            self._decrease()
+            pause = retry_after(error)
+            if pause:
+                self.requests.drain(pause)
+                self.tokens.drain(pause)
+        else:
+            self._count("errors")
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        return max(delay, retry_after(error) or 0)
+
+    def _try_reserve(self, estimate):
+        # 0 when both buckets had room, otherwise how long to wait
+        wait = self.requests.try_take(1)
+        if not wait:
+            wait = self.tokens.try_take(estimate)
+            if not wait:
+                return 0.0
+            self.requests.give_back(1)
+        self._count("waited", wait)
+        return wait
+
+    def _settle(self, estimate, response):
+        # Streamed responses have no usage, the estimate stays
+        usage = response.get("usage") if isinstance(response, dict) else None
+        used = (usage or {}).get("total_tokens", estimate)
+        self.tokens.give_back(estimate - used)
+        self._count("tokens", used)
+        if usage and "completion_tokens" in usage:
+            with self._condition:
+                self.completion_tokens = (
+                    0.8 * self.completion_tokens + 0.2 * usage["completion_tokens"]
+                )
+
+    def _count(self, key, amount=1):
+        with self._condition:
+            self.stats[key] += amount
+
+    # Calls
+
+    def call(self, create, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            estimate = estimate_tokens(kwargs, int(self.completion_tokens))
+            while wait := self._try_reserve(estimate):
+                time.sleep(wait)
+            self._enter()
+            started = time.monotonic()
+            try:
+                self._count("requests")
+                response = create(**kwargs)
+            except Exception as e:
+                self.tokens.give_back(estimate)
+                self._failed(e)
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                error = e
+            else:
+                self._succeeded(time.monotonic() - started)
+                self._settle(estimate, response)
+                return response
+            finally:
+                self._leave()
+            self._count("retries")
+            time.sleep(self._backoff(attempt, error))
+
+    async def acall(self, acreate, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            estimate = estimate_tokens(kwargs, int(self.completion_tokens))
+            while wait := self._try_reserve(estimate):
+                await asyncio.sleep(wait)
+            while not self._try_enter():
+                await asyncio.sleep(0.05)
+            started = time.monotonic()
+            try:
+                self._count("requests")
+                response = await acreate(**kwargs)
+            except Exception as e:
+                self.tokens.give_back(estimate)
+                self._failed(e)
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                error = e
+            else:
+                self._succeeded(time.monotonic() - started)
+                self._settle(estimate, response)
+                return response
+            finally:
+                self._leave()
+            self._count("retries")
+            await asyncio.sleep(self._backoff(attempt, error))
+
+    def report(self):
+        return {
+            **self.stats,
+            "waited": round(self.stats["waited"], 2),
+            "concurrency": round(self.limit, 2),
+        }
+
+
+PATCHED = (openai.ChatCompletion, openai.Completion, openai.Embedding)
+originals = {}
+
+
+def install(limiter=None):
+    # Routes every openai.ChatCompletion/Completion/Embedding request of the
+    # process through the limiter. ChatOpenAI, OpenAI and OpenAIEmbeddings
+    # (langchain with openai<1) call these, no script has to change.
+    limiter = limiter or AdaptiveRateLimiter()
+    uninstall()
+    for api in PATCHED:
+        originals[api] = (api.__dict__["create"], api.__dict__["acreate"])
+        create, acreate = api.create, api.acreate
+
+        @functools.wraps(create)
+        def limited_create(*args, _create=create, **kwargs):
+            return limiter.call(functools.partial(_create, *args), **kwargs)
+
+        @functools.wraps(acreate)
+        async def limited_acreate(*args, _acreate=acreate, **kwargs):
+            return await limiter.acall(functools.partial(_acreate, *args), **kwargs)
+
+        api.create = staticmethod(limited_create)
+        api.acreate = staticmethod(limited_acreate)
+    return limiter
+
+
+def uninstall():
+    for api, (create, acreate) in originals.items():
+        api.create = create
+        api.acreate = acreate
+    originals.clear()
@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import runpy
+import sys
+import time
+
+from harness import cassette, rate_limiter
+
+
+def run_script(path, args):
+    # Runs the script as if it was started from its own folder, the scripts
+    # open files and import modules relative to it
+    path = os.path.abspath(path)
+    os.chdir(os.path.dirname(path))
+    sys.path.insert(0, os.path.dirname(path))
+    sys.argv = [path, *args]
+    runpy.run_path(path, run_name="__main__")
+
+
+if __name__ == "__main__":
+    # python -m harness.run agents/main.py
+    # python -m harness.run --cassette main.jsonl --replay agents/main.py
+    parser = argparse.ArgumentParser(
+        description="Run a script with every OpenAI request rate limited"
+    )
+    parser.add_argument("--rpm", type=int, default=None)
+    parser.add_argument("--tpm", type=int, default=None)
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    parser.add_argument("--cassette", help="record/replay requests in this file")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--record", action="store_true", help="call the API again")
+    group.add_argument("--replay", action="store_true", help="never call the API")
+    parser.add_argument(
+        "--latency",
+        default=cassette.CASSETTE_LATENCY,
+        help="'recorded' or seconds per replayed call",
+    )
+    parser.add_argument("script")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    options = {
+        "rpm": args.rpm,
+        "tpm": args.tpm,
+        "max_concurrency": args.max_concurrency,
+    }
+    reports = [
+        rate_limiter.install(
+            rate_limiter.AdaptiveRateLimiter(
+                **{k: v for k, v in options.items() if v is not None}
+            )
+        )
+    ]
+    if args.cassette:
+        mode = "record" if args.record else "replay" if args.replay else "auto"
+        if mode == "replay":
+            # The clients refuse to start without a key
+            os.environ.setdefault("OPENAI_API_KEY", "replay")
+        # Installed last so replayed calls don't wait for the limiter
+        reports.append(
+            cassette.install(cassette.Cassette(args.cassette, mode, args.latency))
+        )
+
+    started = time.perf_counter()
+    try:
+        run_script(args.script, args.args)
+    finally:
+        report = {"seconds": round(time.perf_counter() - started, 3)}
+        for part in reports:
+            report.update(part.report())
+        print(json.dumps(report), file=sys.stderr)